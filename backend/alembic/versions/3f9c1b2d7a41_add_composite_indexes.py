@@ -0,0 +1,64 @@
+"""add composite indexes for hot queries
+
+Revision ID: 3f9c1b2d7a41
+Revises: 7646b18b7693
+Create Date: 2026-10-18 09:12:40.518230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c1b2d7a41'
+down_revision: Union[str, Sequence[str], None] = '7646b18b7693'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    # get_chat_history: both directions of a conversation, ordered by time
+    ('ix_messages_sender_receiver_created_at', 'messages', ['sender_id', 'receiver_id', 'created_at']),
+    # send_request duplicate check and the sender side of check_users_connected
+    ('ix_connection_requests_sender_receiver_status', 'connection_requests', ['sender_id', 'receiver_id', 'status']),
+    # receiver side of check_users_connected and get_user_received_requests
+    ('ix_connection_requests_receiver_status', 'connection_requests', ['receiver_id', 'status']),
+    # get_user_notifications and get_notification_count
+    ('ix_notifications_user_read_created_at', 'notifications', ['user_id', 'is_read', 'created_at']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The initial migrations never created messages; on databases built
+    # only by `alembic upgrade head` it has to exist before it is indexed.
+    if not sa.inspect(op.get_bind()).has_table('messages'):
+        op.create_table('messages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sender_id', sa.Integer(), nullable=False),
+        sa.Column('receiver_id', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['receiver_id'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['sender_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_messages_id'), 'messages', ['id'], unique=False)
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block. The
+    # flag is ignored on other dialects. if_not_exists covers databases where
+    # Base.metadata.create_all() already built the indexes from the models.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name, table, columns, unique=False,
+                postgresql_concurrently=True, if_not_exists=True
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,45 @@
+"""add counter tables
+
+Revision ID: 8b2e4f6a1c93
+Revises: 3f9c1b2d7a41
+Create Date: 2026-10-18 10:02:17.344871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4f6a1c93'
+down_revision: Union[str, Sequence[str], None] = '3f9c1b2d7a41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('conversation_counters',
+    sa.Column('user_low_id', sa.Integer(), nullable=False),
+    sa.Column('user_high_id', sa.Integer(), nullable=False),
+    sa.Column('message_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_high_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['user_low_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_low_id', 'user_high_id')
+    )
+    op.create_table('notification_counters',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_count', sa.Integer(), nullable=False),
+    sa.Column('unread_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    # Existing rows are not counted here; run `python -m scripts.repair_counters`
+    # once after upgrading.
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('notification_counters')
+    op.drop_table('conversation_counters')
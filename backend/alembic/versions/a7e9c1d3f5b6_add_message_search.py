@@ -0,0 +1,46 @@
+"""add message search
+
+Revision ID: a7e9c1d3f5b6
+Revises: f4c6d8e0a2b5
+Create Date: 2026-10-18 17:05:51.447309
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7e9c1d3f5b6'
+down_revision: Union[str, Sequence[str], None] = 'f4c6d8e0a2b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # The generated column is filled for existing rows as part of this
+        # statement, which rewrites the table.
+        op.execute(
+            "ALTER TABLE messages ADD COLUMN IF NOT EXISTS content_tsv tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED"
+        )
+        op.execute("CREATE INDEX IF NOT EXISTS ix_messages_content_tsv ON messages USING gin (content_tsv)")
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts "
+            "USING fts5(content, content='messages', content_rowid='id')"
+        )
+        op.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_messages_content_tsv")
+        op.execute("ALTER TABLE messages DROP COLUMN IF EXISTS content_tsv")
+    elif dialect == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS messages_fts")
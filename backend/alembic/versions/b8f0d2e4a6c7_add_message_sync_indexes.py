@@ -0,0 +1,56 @@
+"""add message sync indexes
+
+Revision ID: b8f0d2e4a6c7
+Revises: a7e9c1d3f5b6
+Create Date: 2026-10-18 18:21:40.558193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8f0d2e4a6c7'
+down_revision: Union[str, Sequence[str], None] = 'a7e9c1d3f5b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    # Reconnect sync: messages to or from a user after a given id
+    ('ix_messages_receiver_id_id', ['receiver_id', 'id']),
+    ('ix_messages_sender_id_id', ['sender_id', 'id']),
+]
+
+
+def messages_is_partitioned() -> bool:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return False
+    return bind.execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = 'messages'"
+    )).first() is not None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # PostgreSQL can't build an index CONCURRENTLY on a partitioned table;
+    # there the plain build blocks writes to messages while it runs.
+    concurrently = not messages_is_partitioned()
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            op.create_index(
+                name, 'messages', columns, unique=False,
+                postgresql_concurrently=concurrently, if_not_exists=True
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    concurrently = not messages_is_partitioned()
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(INDEXES):
+            op.drop_index(name, table_name='messages', postgresql_concurrently=concurrently, if_exists=True)
@@ -0,0 +1,44 @@
+"""add conversation summaries
+
+Revision ID: c5d7e9f1a2b4
+Revises: 8b2e4f6a1c93
+Create Date: 2026-10-18 11:41:05.218430
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d7e9f1a2b4'
+down_revision: Union[str, Sequence[str], None] = '8b2e4f6a1c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('conversation_summaries',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('peer_id', sa.Integer(), nullable=False),
+    sa.Column('last_message_id', sa.Integer(), nullable=False),
+    sa.Column('last_sender_id', sa.Integer(), nullable=False),
+    sa.Column('last_message_preview', sa.String(), nullable=False),
+    sa.Column('last_message_at', sa.DateTime(), nullable=False),
+    sa.Column('unread_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['last_message_id'], ['messages.id'], ),
+    sa.ForeignKeyConstraint(['last_sender_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['peer_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'peer_id')
+    )
+    op.create_index('ix_conversation_summaries_user_last_message_at', 'conversation_summaries', ['user_id', 'last_message_at'], unique=False)
+    # Existing conversations are filled in by `python -m scripts.repair_counters`.
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_conversation_summaries_user_last_message_at', table_name='conversation_summaries')
+    op.drop_table('conversation_summaries')
@@ -0,0 +1,36 @@
+"""add user versions
+
+Revision ID: c9a1e3f5b7d8
+Revises: b8f0d2e4a6c7
+Create Date: 2026-10-18 19:02:13.417305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9a1e3f5b7d8'
+down_revision: Union[str, Sequence[str], None] = 'b8f0d2e4a6c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_versions',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('notifications_version', sa.Integer(), nullable=False),
+    sa.Column('connections_version', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    # No backfill: a missing row reads as version 0 and no ETag has been
+    # handed out before this table exists.
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_versions')
@@ -0,0 +1,54 @@
+"""coalesce message notifications
+
+Revision ID: d1a4b6c8e0f2
+Revises: c5d7e9f1a2b4
+Create Date: 2026-10-18 13:12:48.901266
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1a4b6c8e0f2'
+down_revision: Union[str, Sequence[str], None] = 'c5d7e9f1a2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+UNREAD_NEW_MESSAGE = "is_read = false AND type = 'new_message'"
+
+SAME_GROUP = (
+    "n2.user_id = notifications.user_id"
+    " AND n2.related_user_id = notifications.related_user_id"
+    " AND n2.is_read = false AND n2.type = 'new_message'"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('notifications', sa.Column('message_count', sa.Integer(), server_default='1', nullable=False))
+    # Fold existing duplicates into the newest row of each group so the
+    # unique index can be built.
+    op.execute(
+        f"UPDATE notifications SET message_count = "
+        f"(SELECT count(*) FROM notifications n2 WHERE {SAME_GROUP}) "
+        f"WHERE {UNREAD_NEW_MESSAGE} AND id = (SELECT max(n2.id) FROM notifications n2 WHERE {SAME_GROUP})"
+    )
+    op.execute(
+        f"DELETE FROM notifications "
+        f"WHERE {UNREAD_NEW_MESSAGE} AND id < (SELECT max(n2.id) FROM notifications n2 WHERE {SAME_GROUP})"
+    )
+    op.create_index(
+        'ux_notifications_unread_new_message', 'notifications', ['user_id', 'related_user_id'], unique=True,
+        postgresql_where=sa.text(UNREAD_NEW_MESSAGE), sqlite_where=sa.text(UNREAD_NEW_MESSAGE)
+    )
+    # Deleted duplicates leave notification_counters high; run
+    # `python -m scripts.repair_counters` once after upgrading.
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ux_notifications_unread_new_message', table_name='notifications')
+    op.drop_column('notifications', 'message_count')
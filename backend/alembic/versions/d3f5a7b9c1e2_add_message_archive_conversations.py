@@ -0,0 +1,39 @@
+"""add message archive conversations
+
+Revision ID: d3f5a7b9c1e2
+Revises: c9a1e3f5b7d8
+Create Date: 2026-10-18 21:14:52.603118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f5a7b9c1e2'
+down_revision: Union[str, Sequence[str], None] = 'c9a1e3f5b7d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('message_archive_conversations',
+    sa.Column('low_user_id', sa.Integer(), nullable=False),
+    sa.Column('high_user_id', sa.Integer(), nullable=False),
+    sa.Column('segment_id', sa.Integer(), nullable=False),
+    sa.Column('byte_offset', sa.BigInteger(), nullable=False),
+    sa.Column('byte_length', sa.Integer(), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['segment_id'], ['message_archive_segments.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('low_user_id', 'high_user_id', 'segment_id')
+    )
+    # Segments archived before this table existed are indexed from their
+    # .index.json files by the next `partition_messages archive` run.
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('message_archive_conversations')
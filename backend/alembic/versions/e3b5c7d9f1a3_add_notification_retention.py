@@ -0,0 +1,56 @@
+"""add notification retention
+
+Revision ID: e3b5c7d9f1a3
+Revises: d1a4b6c8e0f2
+Create Date: 2026-10-18 14:27:33.610592
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b5c7d9f1a3'
+down_revision: Union[str, Sequence[str], None] = 'd1a4b6c8e0f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('notification_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('type', postgresql.ENUM('connection_request', 'connection_accepted', 'connection_rejected', 'new_message', name='notificationtype', create_type=False), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('message', sa.Text(), nullable=False),
+    sa.Column('is_read', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('message_count', sa.Integer(), nullable=False),
+    sa.Column('related_user_id', sa.Integer(), nullable=True),
+    sa.Column('related_request_id', sa.Integer(), nullable=True),
+    sa.Column('related_message_id', sa.Integer(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_notification_archive_user_created_at', 'notification_archive', ['user_id', 'created_at'], unique=False)
+    # Used by the retention job to find expired rows of each type
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_notifications_type_read_created_at', 'notifications', ['type', 'is_read', 'created_at'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_notifications_type_read_created_at', table_name='notifications',
+            postgresql_concurrently=True, if_exists=True
+        )
+    op.drop_index('ix_notification_archive_user_created_at', table_name='notification_archive')
+    op.drop_table('notification_archive')
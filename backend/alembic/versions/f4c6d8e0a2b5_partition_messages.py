@@ -0,0 +1,155 @@
+"""partition messages
+
+Revision ID: f4c6d8e0a2b5
+Revises: e3b5c7d9f1a3
+Create Date: 2026-10-18 15:48:09.127734
+
+"""
+import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4c6d8e0a2b5'
+down_revision: Union[str, Sequence[str], None] = 'e3b5c7d9f1a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+MESSAGE_INDEXES = [
+    ('ix_messages_id', ['id']),
+    ('ix_messages_sender_receiver_created_at', ['sender_id', 'receiver_id', 'created_at']),
+]
+
+
+def add_months(value: datetime.datetime, months: int) -> datetime.datetime:
+    years, month = divmod(value.month - 1 + months, 12)
+    return datetime.datetime(value.year + years, month + 1, 1)
+
+
+def drop_foreign_keys_to_messages(inspector) -> None:
+    # A foreign key to a partitioned table must cover its whole primary key,
+    # (id, created_at); the referencing tables only store the id.
+    for table in ('notifications', 'conversation_summaries'):
+        if not inspector.has_table(table):
+            continue
+        for fk in inspector.get_foreign_keys(table):
+            if fk['referred_table'] == 'messages' and fk.get('name'):
+                op.drop_constraint(fk['name'], table, type_='foreignkey')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('message_archive_segments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('path', sa.String(), nullable=False),
+    sa.Column('range_start', sa.DateTime(), nullable=False),
+    sa.Column('range_end', sa.DateTime(), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('path')
+    )
+    op.create_index(op.f('ix_message_archive_segments_range_start'), 'message_archive_segments', ['range_start'], unique=False)
+
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        # Only PostgreSQL gets partitions; elsewhere archiving deletes rows.
+        return
+    already_partitioned = bind.execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = 'messages'"
+    )).first()
+    if already_partitioned:
+        return
+
+    inspector = sa.inspect(bind)
+    drop_foreign_keys_to_messages(inspector)
+    has_messages = inspector.has_table('messages')
+    if has_messages:
+        # Keep the id sequence when the old table goes away and free up the
+        # index and constraint names for the new one.
+        op.execute("ALTER SEQUENCE IF EXISTS messages_id_seq OWNED BY NONE")
+        op.rename_table('messages', 'messages_unpartitioned')
+        op.execute("ALTER TABLE messages_unpartitioned RENAME CONSTRAINT messages_pkey TO messages_unpartitioned_pkey")
+        for name, _ in MESSAGE_INDEXES:
+            op.execute(f"ALTER INDEX IF EXISTS {name} RENAME TO {name.replace('ix_messages', 'ix_messages_unpartitioned')}")
+    op.execute("CREATE SEQUENCE IF NOT EXISTS messages_id_seq")
+
+    op.execute(
+        "CREATE TABLE messages ("
+        " id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'),"
+        " sender_id INTEGER NOT NULL REFERENCES users (id),"
+        " receiver_id INTEGER NOT NULL REFERENCES users (id),"
+        " content TEXT NOT NULL,"
+        " created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),"
+        " PRIMARY KEY (id, created_at)"
+        ") PARTITION BY RANGE (created_at)"
+    )
+    op.execute("CREATE TABLE messages_default PARTITION OF messages DEFAULT")
+
+    now = datetime.datetime.utcnow()
+    first = datetime.datetime(now.year, now.month, 1)
+    if has_messages:
+        oldest = bind.execute(sa.text("SELECT min(created_at) FROM messages_unpartitioned")).scalar()
+        if oldest is not None:
+            first = min(first, datetime.datetime(oldest.year, oldest.month, 1))
+    month = first
+    while month <= add_months(now, MONTHS_AHEAD):
+        op.execute(
+            f"CREATE TABLE messages_p{month:%Y%m} PARTITION OF messages "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+        )
+        month = add_months(month, 1)
+
+    for name, columns in MESSAGE_INDEXES:
+        op.create_index(name, 'messages', columns, unique=False)
+
+    if has_messages:
+        # One statement for the whole table; schedule a maintenance window
+        # for large installations.
+        op.execute(
+            "INSERT INTO messages (id, sender_id, receiver_id, content, created_at) "
+            "SELECT id, sender_id, receiver_id, content, COALESCE(created_at, now() AT TIME ZONE 'utc') "
+            "FROM messages_unpartitioned"
+        )
+        op.drop_table('messages_unpartitioned')
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+    op.execute("SELECT setval('messages_id_seq', COALESCE((SELECT max(id) FROM messages), 0) + 1, false)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("ALTER SEQUENCE messages_id_seq OWNED BY NONE")
+        op.rename_table('messages', 'messages_partitioned')
+        for name, _ in MESSAGE_INDEXES:
+            op.execute(f"ALTER INDEX IF EXISTS {name} RENAME TO {name.replace('ix_messages', 'ix_messages_partitioned')}")
+        op.execute("ALTER TABLE messages_partitioned RENAME CONSTRAINT messages_pkey TO messages_partitioned_pkey")
+        op.execute(
+            "CREATE TABLE messages ("
+            " id INTEGER NOT NULL DEFAULT nextval('messages_id_seq') PRIMARY KEY,"
+            " sender_id INTEGER NOT NULL REFERENCES users (id),"
+            " receiver_id INTEGER NOT NULL REFERENCES users (id),"
+            " content TEXT NOT NULL,"
+            " created_at TIMESTAMP WITHOUT TIME ZONE"
+            ")"
+        )
+        op.execute(
+            "INSERT INTO messages (id, sender_id, receiver_id, content, created_at) "
+            "SELECT id, sender_id, receiver_id, content, created_at FROM messages_partitioned"
+        )
+        op.drop_table('messages_partitioned')
+        op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+        for name, columns in MESSAGE_INDEXES:
+            op.create_index(name, 'messages', columns, unique=False)
+        # Archived months stay in their segments; the foreign keys dropped on
+        # upgrade are not restored since archived ids may be referenced.
+
+    op.drop_index(op.f('ix_message_archive_segments_range_start'), table_name='message_archive_segments')
+    op.drop_table('message_archive_segments')
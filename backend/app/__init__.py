@@ -1,3 +1,3 @@
-from . import models, schemas, crud
+from . import models, schemas, crud, async_crud
 
-__all__ = ["models", "schemas", "crud"]
+__all__ = ["models", "schemas", "crud", "async_crud"]
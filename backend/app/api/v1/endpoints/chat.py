@@ -1,13 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
-from app.core.database import SessionLocal
-from app import crud, schemas
+from app.core.database import SessionLocal, AsyncSessionLocal, read_session
+from app.core.read_your_writes import must_read_primary
+from app import crud, async_crud, rate_limit, schemas
+from app.core import config, metrics
 from app.websocket_manager import manager
-from typing import List
+from app.message_writer import message_writer
+from app.pagination import decode_cursor, decode_score_cursor, encode_cursor, encode_score_cursor
+from typing import Dict, List, Optional
 import json
 import datetime
+import logging
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
+logger = logging.getLogger(__name__)
 
 def get_db():
     db = SessionLocal()
@@ -16,30 +23,138 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db(request: Request):
+    db = read_session(use_primary=must_read_primary(request))
+    try:
+        yield db
+    finally:
+        db.close()
+
+def parse_last_seen(spec: str) -> Dict[int, int]:
+    """Parse "peer_id:message_id,..." into {peer_id: message_id}; ValueError if malformed."""
+    last_seen = {}
+    for item in spec.split(","):
+        if item.strip():
+            peer_id, message_id = item.split(":")
+            last_seen[int(peer_id)] = int(message_id)
+    return last_seen
+
+def message_frame(message) -> dict:
+    return {
+        "message_id": message.id,
+        "sender_id": message.sender_id,
+        "receiver_id": message.receiver_id,
+        "content": message.content,
+        "timestamp": message.created_at.isoformat()
+    }
+
+async def replay_missed_messages(connection, user_id: int, last_seen_id: Optional[int], last_seen_by_peer: Dict[int, int]):
+    """Stream what the client missed in "sync" frames, then send "sync_complete".
+
+    The replay covers ids up to the newest message at the time the socket
+    registered; anything later arrives as a live frame. A message committed
+    right around that moment can come both ways, so clients dedupe on
+    message_id. If more than WS_SYNC_MAX_MESSAGES are missing, the replay
+    stops there with truncated=true and the client pages the rest over REST.
+    """
+    sent = 0
+    after_id = 0
+    truncated = False
+    async with AsyncSessionLocal() as db:
+        up_to_id = await async_crud.get_latest_message_id(db)
+        while True:
+            if sent >= config.WS_SYNC_MAX_MESSAGES:
+                truncated = bool(await async_crud.get_missed_messages(
+                    db, user_id, last_seen_id, last_seen_by_peer, after_id, up_to_id, 1
+                ))
+                break
+            limit = min(config.WS_SYNC_BATCH_SIZE, config.WS_SYNC_MAX_MESSAGES - sent)
+            batch = await async_crud.get_missed_messages(
+                db, user_id, last_seen_id, last_seen_by_peer, after_id, up_to_id, limit
+            )
+            if not batch:
+                break
+            frame = {"type": "sync", "messages": [message_frame(message) for message in batch]}
+            if not await connection.send_wait(json.dumps(frame)):
+                return
+            sent += len(batch)
+            after_id = batch[-1].id
+            if len(batch) < limit:
+                break
+    
+    logger.info("ws_sync_complete", extra={"user_id": user_id, "synced": sent, "truncated": truncated})
+    await connection.send_wait(json.dumps({
+        "type": "sync_complete",
+        "synced": sent,
+        "last_message_id": after_id or None,
+        "truncated": truncated
+    }))
+
+async def reject(websocket: WebSocket, code: int, reason: str):
+    """Close a handshake with an application close code.
+
+    Closing before accept() makes Starlette answer the upgrade with a bare
+    HTTP 403, so the client never sees the code or reason; accept first.
+    """
+    await websocket.accept()
+    await websocket.close(code=code, reason=reason)
+
 @router.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: int):
-    db = SessionLocal()
+async def websocket_endpoint(
+    websocket: WebSocket,
+    user_id: int,
+    last_seen_id: Optional[int] = Query(None, description="Replay messages after this id from every conversation"),
+    last_seen: Optional[str] = Query(None, description="Per-conversation resume points: peer_id:message_id,...")
+):
+    connection = None
     try:
-        print(f"WebSocket connection attempt for user {user_id}")
-        user = crud.get_user(db, user_id)
+        logger.debug("ws_connect_attempt", extra={"user_id": user_id})
+        # Admission control runs before anything touches the database
+        if config.WS_MAX_CONNECTIONS and manager.connection_count() >= config.WS_MAX_CONNECTIONS:
+            metrics.WS_CONNECTIONS_SHED.inc()
+            logger.warning("ws_shed", extra={"user_id": user_id, "active": manager.connection_count()})
+            await reject(websocket, 1013, "Server busy, retry later")
+            return
+        if await rate_limit.check(rate_limit.WS_HANDSHAKE, f"ip:{rate_limit.client_ip(websocket)}"):
+            await reject(websocket, 4429, "Too many connection attempts")
+            return
+        
+        try:
+            last_seen_by_peer = parse_last_seen(last_seen) if last_seen else {}
+        except ValueError:
+            await reject(websocket, 4400, "Invalid last_seen")
+            return
+        
+        async with AsyncSessionLocal() as db:
+            user = await async_crud.get_user(db, user_id)
         if not user:
-            print(f"User {user_id} not found, closing connection")
-            await websocket.close(code=4004, reason="User not found")
+            logger.info("ws_unknown_user", extra={"user_id": user_id})
+            await reject(websocket, 4004, "User not found")
             return
 
-        print(f"Accepting WebSocket connection for user {user_id}")
-        await manager.connect(websocket, user_id)
-        print(f"User {user_id} connected successfully")
+        connection = await manager.connect(websocket, user_id)
         
         try:
+            if last_seen_id is not None or last_seen_by_peer:
+                await replay_missed_messages(connection, user_id, last_seen_id, last_seen_by_peer)
+            
             while True:
-                print(f"Waiting for message from user {user_id}")
                 data = await websocket.receive_text()
-                print(f"Received message from user {user_id}: {data}")
+                logger.debug("ws_frame_received", extra={"sampled": True, "user_id": user_id, "size": len(data)})
+                
+                # Over-limit frames are dropped before they cost a DB write
+                retry_after = await rate_limit.check(rate_limit.CHAT_SEND, f"user:{user_id}")
+                if retry_after:
+                    connection.send(json.dumps({
+                        "type": "throttled",
+                        "message": "Sending too fast, message was not delivered",
+                        "retry_after": round(retry_after, 3)
+                    }))
+                    continue
                 message_data = json.loads(data)
                 
                 if "receiver_id" not in message_data or "content" not in message_data:
-                    await websocket.send_text(json.dumps({
+                    connection.send(json.dumps({
                         "type": "error",
                         "message": "Invalid message format. Required fields: receiver_id, content"
                     }))
@@ -49,50 +164,60 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int):
                 content = message_data["content"].strip()
                 
                 if not content:
-                    await websocket.send_text(json.dumps({
+                    connection.send(json.dumps({
                         "type": "error",
                         "message": "Message content cannot be empty"
                     }))
                     continue
                 
-                if not crud.check_users_connected(db, user_id, receiver_id):
-                    await websocket.send_text(json.dumps({
+                # Short-lived sessions per message keep idle sockets from
+                # pinning a pooled connection between messages. None is held
+                # across message_writer.submit(): the batch flush needs a
+                # connection from the same pool.
+                async with AsyncSessionLocal() as db:
+                    connected = await async_crud.check_users_connected(db, user_id, receiver_id)
+                if not connected:
+                    connection.send(json.dumps({
                         "type": "error",
                         "message": "You can only chat with connected users"
                     }))
                     continue
                 
-                message = crud.create_message(db, user_id, receiver_id, content)
-                print(f"Message saved to DB with ID: {message.id}")
+                try:
+                    if message_writer.running:
+                        message = await message_writer.submit(user_id, receiver_id, content)
+                    else:
+                        async with AsyncSessionLocal() as db:
+                            message = await async_crud.create_message(db, user_id, receiver_id, content)
+                except Exception:
+                    logger.error("message_save_failed", exc_info=True, extra={"user_id": user_id})
+                    connection.send(json.dumps({
+                        "type": "error",
+                        "message": "Message could not be saved, please retry"
+                    }))
+                    continue
+                logger.debug("message_saved", extra={"sampled": True, "message_id": message.id})
                 
-                sender = crud.get_user(db, user_id)
-                if not manager.is_user_online(receiver_id):
-                    notification = crud.create_notification(
-                        db=db,
-                        user_id=receiver_id,
-                        notification_type=schemas.NotificationType.new_message,
-                        title=f"New message from {sender.username}",
-                        message=content[:50] + "..." if len(content) > 50 else content,
-                        related_user_id=user_id,
-                        related_message_id=message.id
-                    )
+                if not await manager.is_online(receiver_id):
+                    async with AsyncSessionLocal() as db:
+                        await async_crud.notify_new_message(
+                            db=db,
+                            user_id=receiver_id,
+                            sender_id=user_id,
+                            title=f"New message from {user.username}",
+                            preview=content[:50] + "..." if len(content) > 50 else content,
+                            message_id=message.id
+                        )
                 
-                print(f"Sending WebSocket message from {user_id} to {receiver_id}")
                 await manager.send_chat_message(user_id, receiver_id, content, message.id)
-                print(f"WebSocket message sent successfully")
                 
         except WebSocketDisconnect:
-            print(f"User {user_id} disconnected normally")
-            manager.disconnect(user_id)
+            await manager.disconnect(connection)
             
-    except Exception as e:
-        print(f"WebSocket error for user {user_id}: {e}")
-        import traceback
-        traceback.print_exc()
-        manager.disconnect(user_id)
-    finally:
-        print(f"Closing database connection for user {user_id}")
-        db.close()
+    except Exception:
+        logger.exception("ws_error", extra={"user_id": user_id})
+        if connection:
+            await manager.disconnect(connection)
 
 @router.get("/history/{other_user_id}", response_model=schemas.ChatHistoryResponse)
 def get_chat_history(
@@ -100,7 +225,7 @@ def get_chat_history(
     current_user_id: int = Query(..., description="Current user ID"),
     page: int = Query(1, ge=1, description="Page number"),
     limit: int = Query(50, ge=1, le=100, description="Messages per page"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     
     current_user = crud.get_user(db, current_user_id)
@@ -118,18 +243,161 @@ def get_chat_history(
     
     messages = crud.get_chat_history(db, current_user_id, other_user_id, skip=skip, limit=limit)
     
-    all_messages = crud.get_chat_history(db, current_user_id, other_user_id, skip=0, limit=10000)
-    total_count = len(all_messages)
+    total_count = crud.count_chat_messages(db, current_user_id, other_user_id)
+    
+    # Rows of MessageOut's columns go straight to orjson, skipping validation
+    return ORJSONResponse({
+        "messages": [message._asdict() for message in messages],
+        "total_count": total_count,
+        "page": page,
+        "limit": limit
+    })
+
+@router.get("/history/{other_user_id}/cursor", response_model=schemas.ChatHistoryCursorResponse)
+def get_chat_history_cursor(
+    other_user_id: int,
+    current_user_id: int = Query(..., description="Current user ID"),
+    before: Optional[str] = Query(None, description="Cursor: return messages older than this"),
+    after: Optional[str] = Query(None, description="Cursor: return messages newer than this"),
+    limit: int = Query(50, ge=1, le=100, description="Messages per page"),
+    db: Session = Depends(get_read_db)
+):
+    
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+    
+    try:
+        before_key = decode_cursor(before) if before else None
+        after_key = decode_cursor(after) if after else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    current_user = crud.get_user(db, current_user_id)
+    other_user = crud.get_user(db, other_user_id)
+    
+    if not current_user:
+        raise HTTPException(status_code=404, detail="Current user not found")
+    if not other_user:
+        raise HTTPException(status_code=404, detail="Other user not found")
+    
+    if not crud.check_users_connected(db, current_user_id, other_user_id):
+        raise HTTPException(status_code=403, detail="You can only view chat history with connected users")
     
-    return schemas.ChatHistoryResponse(
+    messages, has_more = crud.get_chat_history_page(
+        db, current_user_id, other_user_id, limit=limit, before=before_key, after=after_key
+    )
+    
+    next_cursor = None
+    if has_more:
+        # Continue in the direction we were paging: oldest row going back,
+        # newest row going forward.
+        edge = messages[0] if after_key else messages[-1]
+        next_cursor = encode_cursor(edge.created_at, edge.id)
+    
+    return schemas.ChatHistoryCursorResponse(
         messages=messages,
-        total_count=total_count,
-        page=page,
+        next_cursor=next_cursor,
+        limit=limit
+    )
+
+@router.get("/search", response_model=schemas.MessageSearchResponse)
+def search_messages(
+    current_user_id: int = Query(..., description="Current user ID"),
+    q: str = Query(..., min_length=1, max_length=200, description="Words to search for"),
+    with_user_id: Optional[int] = Query(None, description="Only search the conversation with this user"),
+    cursor: Optional[str] = Query(None, description="Cursor: return hits ranked below this one"),
+    limit: int = Query(20, ge=1, le=100, description="Hits per page"),
+    db: Session = Depends(get_read_db)
+):
+    
+    try:
+        after = decode_score_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    current_user = crud.get_user(db, current_user_id)
+    if not current_user:
+        raise HTTPException(status_code=404, detail="Current user not found")
+    
+    rows, has_more = crud.search_messages(
+        db, current_user_id, q, limit=limit, after=after, with_user_id=with_user_id
+    )
+    
+    hits = [
+        schemas.MessageSearchHit(
+            id=message.id,
+            sender_id=message.sender_id,
+            receiver_id=message.receiver_id,
+            content=message.content,
+            created_at=message.created_at,
+            score=score
+        )
+        for message, score in rows
+    ]
+    
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_score_cursor(hits[-1].score, hits[-1].id)
+    
+    return schemas.MessageSearchResponse(
+        hits=hits,
+        next_cursor=next_cursor,
+        limit=limit
+    )
+
+@router.get("/inbox/{user_id}", response_model=schemas.InboxResponse)
+def get_inbox(
+    user_id: int,
+    before: Optional[str] = Query(None, description="Cursor: return conversations older than this"),
+    limit: int = Query(50, ge=1, le=100, description="Conversations per page"),
+    db: Session = Depends(get_read_db)
+):
+    
+    try:
+        before_key = decode_cursor(before) if before else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    user = crud.get_user(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    rows, has_more = crud.get_inbox(db, user_id, limit=limit, before=before_key)
+    
+    conversations = [
+        schemas.InboxEntry(
+            peer_id=summary.peer_id,
+            peer_username=peer_username,
+            last_message_id=summary.last_message_id,
+            last_sender_id=summary.last_sender_id,
+            last_message_preview=summary.last_message_preview,
+            last_message_at=summary.last_message_at,
+            unread_count=summary.unread_count
+        )
+        for summary, peer_username in rows
+    ]
+    
+    next_cursor = None
+    if has_more:
+        last = conversations[-1]
+        next_cursor = encode_cursor(last.last_message_at, last.peer_id)
+    
+    return schemas.InboxResponse(
+        conversations=conversations,
+        next_cursor=next_cursor,
         limit=limit
     )
 
+@router.post("/inbox/{user_id}/read/{peer_id}")
+def mark_conversation_read(user_id: int, peer_id: int, db: Session = Depends(get_db)):
+    
+    if not crud.mark_conversation_read(db, user_id, peer_id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    return {"message": "Conversation marked as read"}
+
 @router.get("/connected-users/{user_id}", response_model=List[schemas.UserOut])
-def get_connected_users_for_chat(user_id: int, db: Session = Depends(get_db)):
+def get_connected_users_for_chat(user_id: int, db: Session = Depends(get_read_db)):
     
     user = crud.get_user(db, user_id)
     if not user:
@@ -138,7 +406,8 @@ def get_connected_users_for_chat(user_id: int, db: Session = Depends(get_db)):
     connected_users = crud.get_user_connected_users(db, user_id)
     return connected_users
 
-@router.post("/send", response_model=schemas.MessageOut)
+@router.post("/send", response_model=schemas.MessageOut,
+             dependencies=[Depends(rate_limit.limit_sender(rate_limit.CHAT_SEND))])
 def send_message_http(
     message_data: schemas.MessageCreate,
     sender_id: int = Query(..., description="Sender user ID"),
@@ -158,14 +427,8 @@ def send_message_http(
     
     message = crud.create_message(db, sender_id, message_data.receiver_id, message_data.content)
     
-    if manager.is_user_online(message_data.receiver_id):
-        import asyncio
-        try:
-            loop = asyncio.get_event_loop()
-            loop.create_task(manager.send_chat_message(
-                sender_id, message_data.receiver_id, message_data.content, message.id
-            ))
-        except:
-            pass
+    manager.run_from_thread(
+        manager.send_chat_message, sender_id, message_data.receiver_id, message_data.content, message.id
+    )
     
     return message
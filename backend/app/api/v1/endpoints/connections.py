@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.core.database import SessionLocal
-from app import crud, schemas
+from app import crud, rate_limit, schemas
 from app.websocket_manager import manager
-import asyncio
+from app.loaders import UserLoader
+import logging
 
 router = APIRouter(prefix="/connections", tags=["Connections"])
+logger = logging.getLogger(__name__)
 
 def get_db():
     db = SessionLocal()
@@ -14,42 +16,102 @@ def get_db():
     finally:
         db.close()
 
-@router.post("/send", response_model=schemas.ConnectionRequestOut)
+@router.post("/send", response_model=schemas.ConnectionRequestOut,
+             dependencies=[Depends(rate_limit.limit_sender(rate_limit.CONNECTION_REQUESTS))])
 def send_request(sender_id: int, req: schemas.ConnectionRequestCreate, db: Session = Depends(get_db)):
     if sender_id == req.receiver_id:
         raise HTTPException(status_code=400, detail="You cannot send a request to yourself")
     
     connection_request = crud.send_request(db, sender_id, req.receiver_id)
+    logger.info("connection_request_sent", extra={
+        "request_id": connection_request.id, "sender_id": sender_id, "receiver_id": req.receiver_id
+    })
     
     sender = crud.get_user(db, sender_id)
+    title, message = crud.request_notification_text(schemas.NotificationType.connection_request, sender.username)
     
     notification = crud.create_notification(
         db=db,
         user_id=req.receiver_id,
         notification_type=schemas.NotificationType.connection_request,
-        title="New Connection Request",
-        message=f"{sender.username} wants to connect with you",
+        title=title,
+        message=message,
         related_user_id=sender_id,
         related_request_id=connection_request.id
     )
     
-    if manager.is_user_online(req.receiver_id):
-        try:
-            loop = asyncio.get_event_loop()
-            loop.create_task(manager.send_notification(req.receiver_id, {
-                "notification_id": notification.id,
-                "title": notification.title,
-                "message": notification.message,
-                "type": notification.type,
-                "related_user_id": sender_id,
-                "related_username": sender.username
-            }))
-        except:
-            pass  # If no event loop, notification is still saved in DB
+    # If delivery fails, the notification is still saved in DB
+    manager.run_from_thread(manager.send_notification, req.receiver_id, {
+        "notification_id": notification.id,
+        "title": notification.title,
+        "message": notification.message,
+        "type": notification.type,
+        "related_user_id": sender_id,
+        "related_username": sender.username
+    })
     
     return connection_request
 
-@router.post("/{request_id}/accept", response_model=schemas.ConnectionRequestOut)
+async def push_notifications(payloads):
+    for user_id, payload in payloads:
+        await manager.send_notification(user_id, payload)
+
+def notify_batch(db: Session, notifications):
+    """Push a batch's notifications to online users with one hop onto the event loop."""
+    users = UserLoader(db).want(notification.related_user_id for notification in notifications)
+    payloads = [
+        (notification.user_id, {
+            "notification_id": notification.id,
+            "title": notification.title,
+            "message": notification.message,
+            "type": notification.type,
+            "related_user_id": notification.related_user_id,
+            "related_username": users.username(notification.related_user_id)
+        })
+        for notification in notifications
+    ]
+    if payloads:
+        manager.run_from_thread(push_notifications, payloads)
+
+def batch_response(results) -> schemas.ConnectionRequestBatchResponse:
+    return schemas.ConnectionRequestBatchResponse(results=[
+        schemas.ConnectionRequestBatchItem(id=item_id, status=status, request=request)
+        for item_id, (status, request) in results.items()
+    ])
+
+@router.post("/send-batch", response_model=schemas.ConnectionRequestBatchResponse,
+             dependencies=[Depends(rate_limit.limit_sender(rate_limit.CONNECTION_REQUESTS, "receiver_ids"))])
+def send_requests_batch(sender_id: int, batch: schemas.ConnectionRequestBatchCreate, db: Session = Depends(get_db)):
+    sender = crud.get_user(db, sender_id)
+    if not sender:
+        raise HTTPException(status_code=404, detail="Sender not found")
+    
+    results, notifications = crud.send_requests(db, sender, batch.receiver_ids)
+    logger.info("connection_requests_sent", extra={"sender_id": sender_id, "created_count": len(notifications)})
+    
+    notify_batch(db, notifications)
+    return batch_response(results)
+
+@router.post("/accept-batch", response_model=schemas.ConnectionRequestBatchResponse,
+             dependencies=[Depends(rate_limit.limit_client(rate_limit.CONNECTION_REQUESTS, "request_ids"))])
+def accept_requests_batch(batch: schemas.ConnectionRequestBatchUpdate, db: Session = Depends(get_db)):
+    results, notifications = crud.update_requests(db, batch.request_ids, schemas.RequestStatus.accepted)
+    logger.info("connection_requests_accepted", extra={"updated_count": len(notifications)})
+    
+    notify_batch(db, notifications)
+    return batch_response(results)
+
+@router.post("/reject-batch", response_model=schemas.ConnectionRequestBatchResponse,
+             dependencies=[Depends(rate_limit.limit_client(rate_limit.CONNECTION_REQUESTS, "request_ids"))])
+def reject_requests_batch(batch: schemas.ConnectionRequestBatchUpdate, db: Session = Depends(get_db)):
+    results, notifications = crud.update_requests(db, batch.request_ids, schemas.RequestStatus.rejected)
+    logger.info("connection_requests_rejected", extra={"updated_count": len(notifications)})
+    
+    notify_batch(db, notifications)
+    return batch_response(results)
+
+@router.post("/{request_id}/accept", response_model=schemas.ConnectionRequestOut,
+             dependencies=[Depends(rate_limit.limit_client(rate_limit.CONNECTION_REQUESTS))])
 def accept_request(request_id: int, db: Session = Depends(get_db)):
     request = crud.get_connection_request(db, request_id)
     if not request:
@@ -58,39 +120,37 @@ def accept_request(request_id: int, db: Session = Depends(get_db)):
     updated = crud.update_request(db, request_id, schemas.RequestStatus.accepted)
     if not updated:
         raise HTTPException(status_code=404, detail="Request not found")
+    logger.info("connection_request_accepted", extra={"request_id": request_id})
     
     # Get receiver info for notification
     receiver = crud.get_user(db, request.receiver_id)
+    title, message = crud.request_notification_text(schemas.NotificationType.connection_accepted, receiver.username)
     
     # Create notification for sender
     notification = crud.create_notification(
         db=db,
         user_id=request.sender_id,
         notification_type=schemas.NotificationType.connection_accepted,
-        title="Connection Request Accepted",
-        message=f"{receiver.username} accepted your connection request",
+        title=title,
+        message=message,
         related_user_id=request.receiver_id,
         related_request_id=request_id
     )
     
-    # Send real-time notification if user is online
-    if manager.is_user_online(request.sender_id):
-        try:
-            loop = asyncio.get_event_loop()
-            loop.create_task(manager.send_notification(request.sender_id, {
-                "notification_id": notification.id,
-                "title": notification.title,
-                "message": notification.message,
-                "type": notification.type,
-                "related_user_id": request.receiver_id,
-                "related_username": receiver.username
-            }))
-        except:
-            pass
+    # Send real-time notification if user is online on any worker
+    manager.run_from_thread(manager.send_notification, request.sender_id, {
+        "notification_id": notification.id,
+        "title": notification.title,
+        "message": notification.message,
+        "type": notification.type,
+        "related_user_id": request.receiver_id,
+        "related_username": receiver.username
+    })
     
     return updated
 
-@router.post("/{request_id}/reject", response_model=schemas.ConnectionRequestOut)
+@router.post("/{request_id}/reject", response_model=schemas.ConnectionRequestOut,
+             dependencies=[Depends(rate_limit.limit_client(rate_limit.CONNECTION_REQUESTS))])
 def reject_request(request_id: int, db: Session = Depends(get_db)):
     request = crud.get_connection_request(db, request_id)
     if not request:
@@ -100,32 +160,29 @@ def reject_request(request_id: int, db: Session = Depends(get_db)):
     updated = crud.update_request(db, request_id, schemas.RequestStatus.rejected)
     if not updated:
         raise HTTPException(status_code=404, detail="Request not found")
+    logger.info("connection_request_rejected", extra={"request_id": request_id})
     
     receiver = crud.get_user(db, request.receiver_id)
+    title, message = crud.request_notification_text(schemas.NotificationType.connection_rejected, receiver.username)
     
     notification = crud.create_notification(
         db=db,
         user_id=request.sender_id,
         notification_type=schemas.NotificationType.connection_rejected,
-        title="Connection Request Rejected",
-        message=f"{receiver.username} declined your connection request",
+        title=title,
+        message=message,
         related_user_id=request.receiver_id,
         related_request_id=request_id
     )
     
-    # Send real-time notification if user is online
-    if manager.is_user_online(request.sender_id):
-        try:
-            loop = asyncio.get_event_loop()
-            loop.create_task(manager.send_notification(request.sender_id, {
-                "notification_id": notification.id,
-                "title": notification.title,
-                "message": notification.message,
-                "type": notification.type,
-                "related_user_id": request.receiver_id,
-                "related_username": receiver.username
-            }))
-        except:
-            pass
+    # Send real-time notification if user is online on any worker
+    manager.run_from_thread(manager.send_notification, request.sender_id, {
+        "notification_id": notification.id,
+        "title": notification.title,
+        "message": notification.message,
+        "type": notification.type,
+        "related_user_id": request.receiver_id,
+        "related_username": receiver.username
+    })
     
     return updated
@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
-from app.core.database import SessionLocal
-from app import crud, schemas, models
+from app.core.database import SessionLocal, read_session
+from app.core.read_your_writes import must_read_primary
+from app import crud, etags, schemas, models
+from app.loaders import UserLoader
 from typing import List
 import datetime
+import logging
 
 router = APIRouter(prefix="/notifications", tags=["Notifications"])
+logger = logging.getLogger(__name__)
 
 def get_db():
     db = SessionLocal()
@@ -14,25 +19,42 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db(request: Request):
+    db = read_session(use_primary=must_read_primary(request))
+    try:
+        yield db
+    finally:
+        db.close()
+
 @router.get("/", response_model=schemas.NotificationResponse)
 def get_notifications(
+    request: Request,
+    response: Response,
     user_id: int = Query(..., description="User ID to get notifications for"),
     skip: int = Query(0, ge=0, description="Number of notifications to skip"),
     limit: int = Query(50, ge=1, le=100, description="Number of notifications to return"),
     unread_only: bool = Query(False, description="Return only unread notifications"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     
     user = crud.get_user(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    not_modified = etags.conditional(db, request, response, user_id, crud.NOTIFICATIONS_VERSION)
+    if not_modified:
+        return not_modified
+    
     notifications = crud.get_user_notifications(db, user_id, skip, limit, unread_only)
     counts = crud.get_notification_count(db, user_id)
     
+    users = UserLoader(db).want(n.related_user_id for n in notifications)
+    
+    # Plain dicts in NotificationWithDetails field order, encoded by orjson
+    # without a validation pass; the rows already have the schema's types
     enriched_notifications = []
     for notification in notifications:
-        notification_dict = {
+        enriched_notifications.append({
             "id": notification.id,
             "user_id": notification.user_id,
             "type": notification.type,
@@ -40,29 +62,23 @@ def get_notifications(
             "message": notification.message,
             "is_read": notification.is_read,
             "created_at": notification.created_at,
+            "message_count": notification.message_count,
             "related_user_id": notification.related_user_id,
+            "related_user_username": users.username(notification.related_user_id),
             "related_request_id": notification.related_request_id,
-            "related_message_id": notification.related_message_id,
-            "related_user_username": None
-        }
-        
-        if notification.related_user_id:
-            related_user = crud.get_user(db, notification.related_user_id)
-            if related_user:
-                notification_dict["related_user_username"] = related_user.username
-        
-        enriched_notifications.append(schemas.NotificationWithDetails(**notification_dict))
-    
-    return schemas.NotificationResponse(
-        notifications=enriched_notifications,
-        total_count=counts["total_count"],
-        unread_count=counts["unread_count"]
-    )
+            "related_message_id": notification.related_message_id
+        })
+    
+    return ORJSONResponse({
+        "notifications": enriched_notifications,
+        "total_count": counts["total_count"],
+        "unread_count": counts["unread_count"]
+    }, headers=response.headers)
 
 @router.get("/count", response_model=schemas.NotificationCount)
 def get_notification_count(
     user_id: int = Query(..., description="User ID to get notification count for"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     
     user = crud.get_user(db, user_id)
@@ -84,6 +100,7 @@ def mark_notifications_read(
         raise HTTPException(status_code=404, detail="User not found")
     
     success = crud.mark_notifications_as_read(db, user_id, mark_read_data.notification_ids)
+    logger.debug("notifications_marked_read", extra={"user_id": user_id, "count": len(mark_read_data.notification_ids)})
     
     if success:
         return {"message": f"Marked {len(mark_read_data.notification_ids)} notifications as read"}
@@ -101,6 +118,7 @@ def mark_all_notifications_read(
         raise HTTPException(status_code=404, detail="User not found")
     
     success = crud.mark_all_notifications_as_read(db, user_id)
+    logger.debug("notifications_marked_all_read", extra={"user_id": user_id})
     
     if success:
         return {"message": "All notifications marked as read"}
@@ -119,6 +137,7 @@ def delete_notification(
         raise HTTPException(status_code=404, detail="User not found")
     
     success = crud.delete_notification(db, notification_id, user_id)
+    logger.debug("notification_deleted", extra={"user_id": user_id, "notification_id": notification_id, "found": success})
     
     if success:
         return {"message": "Notification deleted successfully"}
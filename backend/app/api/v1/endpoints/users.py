@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
-from app.core.database import SessionLocal
-from app import crud, schemas
+from app.core.database import SessionLocal, read_session
+from app.core.read_your_writes import must_read_primary
+from app import crud, etags, schemas
+from app.loaders import UserLoader
 from typing import List
 
 router = APIRouter(prefix="/users", tags=["Users"])
@@ -13,6 +16,30 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db(request: Request):
+    db = read_session(use_primary=must_read_primary(request))
+    try:
+        yield db
+    finally:
+        db.close()
+
+def with_usernames(db: Session, requests):
+    users = UserLoader(db).want(
+        user_id for request in requests for user_id in (request.sender_id, request.receiver_id)
+    )
+    return [
+        schemas.ConnectionRequestWithUsers(
+            id=request.id,
+            sender_id=request.sender_id,
+            receiver_id=request.receiver_id,
+            status=request.status,
+            created_at=request.created_at,
+            sender_username=users.username(request.sender_id),
+            receiver_username=users.username(request.receiver_id)
+        )
+        for request in requests
+    ]
+
 @router.post("/", response_model=schemas.UserOut)
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db_user = crud.get_user_by_username(db, username=user.username)
@@ -21,40 +48,64 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return crud.create_user(db=db, user=user)
 
 @router.get("/", response_model=List[schemas.UserOut])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     users = crud.get_users(db, skip=skip, limit=limit)
-    return users
+    return ORJSONResponse([{"id": user.id, "username": user.username} for user in users])
+
+@router.get("/batch", response_model=schemas.UserBatchResponse)
+def read_users_batch(
+    ids: List[int] = Query([], max_length=schemas.MAX_BATCH_SIZE, description="User IDs to fetch"),
+    db: Session = Depends(get_read_db)
+):
+    user_ids = list(dict.fromkeys(ids))
+    users = crud.get_users_by_ids(db, user_ids)
+    return schemas.UserBatchResponse(
+        users=[users[user_id] for user_id in user_ids if user_id in users],
+        missing_ids=[user_id for user_id in user_ids if user_id not in users]
+    )
 
 @router.get("/{user_id}", response_model=schemas.UserOut)
-def read_user(user_id: int, db: Session = Depends(get_db)):
+def read_user(user_id: int, db: Session = Depends(get_read_db)):
     db_user = crud.get_user(db, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
 
 @router.get("/{user_id}/connections", response_model=List[schemas.UserOut])
-def get_user_connections(user_id: int, db: Session = Depends(get_db)):
+def get_user_connections(user_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
     db_user = crud.get_user(db, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
+    not_modified = etags.conditional(db, request, response, user_id, crud.CONNECTIONS_VERSION)
+    if not_modified:
+        return not_modified
+    
     connected_users = crud.get_user_connections(db, user_id=user_id)
     return connected_users
 
-@router.get("/{user_id}/sent-requests", response_model=List[schemas.ConnectionRequestOut])
-def get_user_sent_requests(user_id: int, db: Session = Depends(get_db)):
+@router.get("/{user_id}/sent-requests", response_model=List[schemas.ConnectionRequestWithUsers])
+def get_user_sent_requests(user_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
     db_user = crud.get_user(db, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
+    not_modified = etags.conditional(db, request, response, user_id, crud.CONNECTIONS_VERSION)
+    if not_modified:
+        return not_modified
+    
     sent_requests = crud.get_user_sent_requests(db, user_id=user_id)
-    return sent_requests
+    return with_usernames(db, sent_requests)
 
-@router.get("/{user_id}/received-requests", response_model=List[schemas.ConnectionRequestOut])
-def get_user_received_requests(user_id: int, db: Session = Depends(get_db)):
+@router.get("/{user_id}/received-requests", response_model=List[schemas.ConnectionRequestWithUsers])
+def get_user_received_requests(user_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
     db_user = crud.get_user(db, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
+    not_modified = etags.conditional(db, request, response, user_id, crud.CONNECTIONS_VERSION)
+    if not_modified:
+        return not_modified
+    
     received_requests = crud.get_user_received_requests(db, user_id=user_id)
-    return received_requests
+    return with_usernames(db, received_requests)
@@ -0,0 +1,78 @@
+"""AsyncSession versions of the crud functions used on the WebSocket path.
+
+Reads are issued natively through the async driver. Writes run the sync
+crud functions on the session's connection via run_sync, so both paths
+share one implementation of every write.
+"""
+from sqlalchemy import func, select
+from typing import Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import crud, models, schemas
+from .connection_cache import connection_cache
+
+async def get_user(db: AsyncSession, user_id: int):
+    result = await db.execute(select(models.User).where(models.User.id == user_id))
+    return result.scalars().first()
+
+async def check_users_connected(db: AsyncSession, user1_id: int, user2_id: int) -> bool:
+    if crud.cached_users_connected(user1_id, user2_id):
+        return True
+    token = connection_cache.load_token()
+    result = await db.execute(crud.connected_user_ids_query(user1_id))
+    connected_ids = crud.other_user_ids(result.all(), user1_id)
+    connection_cache.put(user1_id, connected_ids, token)
+    return user2_id in connected_ids
+
+async def get_latest_message_id(db: AsyncSession) -> int:
+    result = await db.execute(select(func.max(models.Message.id)))
+    return result.scalar() or 0
+
+async def get_missed_messages(
+    db: AsyncSession,
+    user_id: int,
+    last_seen_id: Optional[int],
+    last_seen_by_peer: Dict[int, int],
+    after_id: int,
+    up_to_id: int,
+    limit: int
+) -> List[models.Message]:
+    result = await db.execute(
+        crud.missed_messages_query(user_id, last_seen_id, last_seen_by_peer, after_id, up_to_id, limit)
+    )
+    return list(result.scalars().all())
+
+async def create_message(db: AsyncSession, sender_id: int, receiver_id: int, content: str):
+    return await db.run_sync(crud.create_message, sender_id, receiver_id, content)
+
+async def create_notification(
+    db: AsyncSession,
+    user_id: int,
+    notification_type: schemas.NotificationType,
+    title: str,
+    message: str,
+    related_user_id: int = None,
+    related_request_id: int = None,
+    related_message_id: int = None
+):
+    return await db.run_sync(
+        lambda session: crud.create_notification(
+            db=session,
+            user_id=user_id,
+            notification_type=notification_type,
+            title=title,
+            message=message,
+            related_user_id=related_user_id,
+            related_request_id=related_request_id,
+            related_message_id=related_message_id
+        )
+    )
+
+async def notify_new_message(
+    db: AsyncSession,
+    user_id: int,
+    sender_id: int,
+    title: str,
+    preview: str,
+    message_id: int
+):
+    return await db.run_sync(crud.notify_new_message, user_id, sender_id, title, preview, message_id)
@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, FrozenSet, Iterable, Optional, Tuple
+
+from app.core import config
+
+
+class ConnectionGraphCache:
+    """Bounded LRU of user id -> ids of the users they are connected with.
+
+    Entries are loaded lazily from the database and patched in place when
+    a request is accepted or revoked. on_edge_change, when set, is called
+    with every local edit so other workers can apply_edge() it; ``ttl``
+    bounds how long an edit lost on the way (e.g. during a Redis outage)
+    stays invisible there.
+    """
+
+    def __init__(self, max_users: int, ttl: Optional[float] = None):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Tuple[float, FrozenSet[int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every edge change; a load that raced with one is dropped
+        self._generation = 0
+        self.on_edge_change: Optional[Callable[[int, int, bool], None]] = None
+
+    def get(self, user_id: int) -> Optional[FrozenSet[int]]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            loaded_at, connected_ids = entry
+            if self.ttl is not None and time.monotonic() - loaded_at > self.ttl:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return connected_ids
+
+    def load_token(self) -> int:
+        """Call before querying the database for an entry that will be put()."""
+        with self._lock:
+            return self._generation
+
+    def put(self, user_id: int, connected_ids: Iterable[int], token: int):
+        with self._lock:
+            if token != self._generation:
+                return
+            self._entries[user_id] = (time.monotonic(), frozenset(connected_ids))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def add_connection(self, user1_id: int, user2_id: int):
+        self._changed(user1_id, user2_id, connected=True)
+
+    def remove_connection(self, user1_id: int, user2_id: int):
+        self._changed(user1_id, user2_id, connected=False)
+
+    def _changed(self, user1_id: int, user2_id: int, connected: bool):
+        self.apply_edge(user1_id, user2_id, connected)
+        if self.on_edge_change is not None:
+            self.on_edge_change(user1_id, user2_id, connected)
+
+    def apply_edge(self, user1_id: int, user2_id: int, connected: bool):
+        with self._lock:
+            self._generation += 1
+            for user_id, other_id in ((user1_id, user2_id), (user2_id, user1_id)):
+                entry = self._entries.get(user_id)
+                if entry is None:
+                    continue
+                loaded_at, connected_ids = entry
+                if connected:
+                    connected_ids = connected_ids | {other_id}
+                else:
+                    connected_ids = connected_ids - {other_id}
+                self._entries[user_id] = (loaded_at, connected_ids)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+connection_cache = ConnectionGraphCache(
+    max_users=config.CONNECTION_CACHE_MAX_USERS,
+    ttl=config.CONNECTION_CACHE_TTL_SECONDS or None,
+)
@@ -1,3 +1,3 @@
-from .database import Base, SessionLocal, engine
+from .database import Base, SessionLocal, engine, AsyncSessionLocal, async_engine
 
-__all__ = ["Base", "SessionLocal", "engine"]
\ No newline at end of file
+__all__ = ["Base", "SessionLocal", "engine", "AsyncSessionLocal", "async_engine"]
\ No newline at end of file
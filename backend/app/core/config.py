@@ -0,0 +1,84 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# WebSocket fan-out between workers: "memory" (single process) or "redis"
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Accepted-connection adjacency cache used by check_users_connected. Edits
+# are broadcast to the other workers over the pub/sub backend; the TTL only
+# bounds staleness when a broadcast is lost
+CONNECTION_CACHE_MAX_USERS = int(os.getenv("CONNECTION_CACHE_MAX_USERS", "100000"))
+CONNECTION_CACHE_TTL_SECONDS = float(os.getenv("CONNECTION_CACHE_TTL_SECONDS", "300"))
+
+# With read replicas, users touched by a write read from the primary for this
+# many seconds so replica lag never hides their own changes. The marks are
+# kept per worker ("memory") or shared through REDIS_URL ("redis"); use
+# "redis" when a user's requests can land on different workers.
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+READ_YOUR_WRITES_BACKEND = os.getenv("READ_YOUR_WRITES_BACKEND", "memory")
+READ_YOUR_WRITES_MAX_USERS = int(os.getenv("READ_YOUR_WRITES_MAX_USERS", "100000"))
+
+# User snapshot and GET /users/ page cache: "memory" (per worker, LRU of
+# USER_CACHE_MAX_ENTRIES), "redis" (shared via REDIS_URL) or "none"
+USER_CACHE_BACKEND = os.getenv("USER_CACHE_BACKEND", "memory")
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "100000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
+# With "memory", a user created on one worker only retires that worker's
+# cached /users/ pages; the other workers' copies live this long at most
+USER_CACHE_PAGE_TTL_SECONDS = float(os.getenv("USER_CACHE_PAGE_TTL_SECONDS", "5"))
+
+# Token-bucket rate limits: "memory" (per worker), "redis" (shared via
+# REDIS_URL) or "none". Each bucket refills at *_PER_SECOND up to *_BURST;
+# a rate of 0 turns that bucket off. Chat sends and connection requests are
+# limited per user, WebSocket handshakes per client IP.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_CHAT_PER_SECOND = float(os.getenv("RATE_LIMIT_CHAT_PER_SECOND", "5"))
+RATE_LIMIT_CHAT_BURST = int(os.getenv("RATE_LIMIT_CHAT_BURST", "20"))
+RATE_LIMIT_REQUESTS_PER_SECOND = float(os.getenv("RATE_LIMIT_REQUESTS_PER_SECOND", "2"))
+RATE_LIMIT_REQUESTS_BURST = int(os.getenv("RATE_LIMIT_REQUESTS_BURST", "500"))
+RATE_LIMIT_WS_HANDSHAKE_PER_SECOND = float(os.getenv("RATE_LIMIT_WS_HANDSHAKE_PER_SECOND", "2"))
+RATE_LIMIT_WS_HANDSHAKE_BURST = int(os.getenv("RATE_LIMIT_WS_HANDSHAKE_BURST", "10"))
+
+# New WebSockets are refused (close code 1013) once this worker holds this
+# many; 0 means no limit
+WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", "10000"))
+
+# Opt-in write-behind batching of WebSocket chat messages
+MESSAGE_BATCHING_ENABLED = os.getenv("MESSAGE_BATCHING_ENABLED", "false").lower() in ("1", "true", "yes")
+MESSAGE_BATCH_MAX_SIZE = int(os.getenv("MESSAGE_BATCH_MAX_SIZE", "200"))
+MESSAGE_BATCH_MAX_LATENCY_MS = float(os.getenv("MESSAGE_BATCH_MAX_LATENCY_MS", "10"))
+
+# Per-socket outbound queue; when it is full either drop the oldest frame
+# ("drop_oldest") or close the slow socket ("disconnect")
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+
+# Logging: default level, per-logger overrides ("app.websocket_manager=DEBUG,...")
+# and the fraction of per-message events kept (records logged with sampled=True)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+
+# Notification retention: read notifications older than their type's TTL (days)
+# are deleted or moved to notification_archive. NOTIFICATION_TTLS overrides the
+# default per type ("new_message=30,connection_request=180"); a non-zero
+# NOTIFICATION_UNREAD_TTL_DAYS expires unread rows too. Interval 0 disables the
+# background job (scripts/purge_notifications.py still works).
+NOTIFICATION_RETENTION_MODE = os.getenv("NOTIFICATION_RETENTION_MODE", "delete")
+NOTIFICATION_TTL_DAYS = float(os.getenv("NOTIFICATION_TTL_DAYS", "90"))
+NOTIFICATION_TTLS = os.getenv("NOTIFICATION_TTLS", "")
+NOTIFICATION_UNREAD_TTL_DAYS = float(os.getenv("NOTIFICATION_UNREAD_TTL_DAYS", "0"))
+NOTIFICATION_RETENTION_INTERVAL_SECONDS = float(os.getenv("NOTIFICATION_RETENTION_INTERVAL_SECONDS", "3600"))
+NOTIFICATION_RETENTION_BATCH_SIZE = int(os.getenv("NOTIFICATION_RETENTION_BATCH_SIZE", "1000"))
+
+# Where scripts/partition_messages.py writes archived message segments
+MESSAGE_ARCHIVE_DIR = os.getenv("MESSAGE_ARCHIVE_DIR", "./archive")
+
+# Reconnect sync: missed messages are replayed in frames of WS_SYNC_BATCH_SIZE,
+# up to WS_SYNC_MAX_MESSAGES (beyond that the client is told to use REST)
+WS_SYNC_BATCH_SIZE = int(os.getenv("WS_SYNC_BATCH_SIZE", "200"))
+WS_SYNC_MAX_MESSAGES = int(os.getenv("WS_SYNC_MAX_MESSAGES", "5000"))
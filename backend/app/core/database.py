@@ -1,11 +1,77 @@
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from typing import Optional
+import itertools
 import os
 from dotenv import load_dotenv
+from app.core import metrics
+from app.core.metrics import instrument_engine
 
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 engine = create_engine(DATABASE_URL)
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+# Optional comma-separated read replicas of DATABASE_URL, used round-robin by
+# read-only endpoints (see read_session)
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+
+replica_engines = [create_engine(url) for url in DATABASE_REPLICA_URLS]
+for replica_engine in replica_engines:
+    instrument_engine(replica_engine)
+_next_replica = itertools.cycle(replica_engines).__next__ if replica_engines else None
+
+class RoutingSession(Session):
+    """Session that reads from info["replica"] until it writes.
+
+    The first flush or DML statement drops the replica for the rest of the
+    session, so anything it reads afterwards comes from the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica")
+        if replica is not None and not self._flushing and not getattr(clause, "is_dml", False):
+            return replica
+        self.info.pop("replica", None)
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
+
+def read_session(use_primary: bool = False) -> RoutingSession:
+    """Session for a read-only request: the next replica, or the primary if
+    there are none or the caller must see its own recent writes."""
+    db = ReadSessionLocal()
+    if _next_replica is not None and not use_primary:
+        db.info["replica"] = _next_replica()
+        metrics.DB_READ_SESSIONS.labels("replica").inc()
+    else:
+        metrics.DB_READ_SESSIONS.labels("primary").inc()
+    return db
+
+def replica_of(db: Session) -> Optional[object]:
+    """The replica engine db is reading from, if any; its data may lag the primary."""
+    return db.info.get("replica")
+
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+def get_async_database_url(url: str) -> str:
+    """Swap the sync DBAPI driver in DATABASE_URL for its asyncio counterpart."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend!r}, set ASYNC_DATABASE_URL")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or get_async_database_url(DATABASE_URL)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+instrument_engine(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
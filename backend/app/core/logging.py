@@ -0,0 +1,120 @@
+"""Structured, non-blocking logging for the app.* loggers.
+
+Records are handed to a queue by the calling thread and written to stdout
+as JSON lines by a QueueListener thread, so a slow stdout or log shipper
+never blocks the event loop. Extra fields passed with ``extra={...}``
+become top-level JSON keys.
+
+Per-message events should be logged with ``extra={"sampled": True, ...}``;
+only LOG_SAMPLE_RATE of those are kept.
+"""
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from typing import Dict, Optional
+
+from app.core import config
+
+# Attributes every LogRecord has; anything else came in through extra=
+RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "sampled"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.utcfromtimestamp(record.created).isoformat(timespec="milliseconds") + "Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RESERVED_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps extra fields and tracebacks as separate attributes.
+
+    The stock prepare() folds the traceback into the message text.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only ``rate`` of the records flagged with sampled=True."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "sampled", False):
+            return random.random() < self.rate
+        return True
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(
+    level: str = config.LOG_LEVEL,
+    levels: str = config.LOG_LEVELS,
+    sample_rate: float = config.LOG_SAMPLE_RATE,
+):
+    """Route the "app" logger tree through a queue to a JSON stdout handler."""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    queue_handler = StructuredQueueHandler(queue.SimpleQueue())
+    # Sample before enqueueing so dropped records cost nothing downstream
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(level.upper())
+    app_logger.addHandler(queue_handler)
+    app_logger.propagate = False
+    for name, module_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
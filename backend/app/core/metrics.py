@@ -0,0 +1,123 @@
+"""Prometheus metrics for HTTP routes, WebSockets and the database.
+
+Everything here is a counter increment or a histogram observation on the
+hot path; gauges that would need bookkeeping per frame (queue depths) are
+computed when /metrics is scraped instead.
+"""
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being handled",
+)
+
+WS_CONNECTIONS_OPENED = Counter("ws_connections_opened_total", "WebSocket connections accepted")
+WS_CONNECTIONS_CLOSED = Counter("ws_connections_closed_total", "WebSocket connections closed", ["code"])
+WS_ACTIVE_CONNECTIONS = Gauge("ws_active_connections", "Open WebSocket connections on this worker")
+WS_FRAMES_QUEUED = Counter("ws_frames_queued_total", "Frames queued to local sockets by ConnectionManager")
+WS_FRAMES_DROPPED = Counter(
+    "ws_frames_dropped_total",
+    "Frames that never reached a local socket's queue or were evicted from it",
+    ["reason"]
+)
+WS_SEND_FAILURES = Counter("ws_send_failures_total", "Socket writes that raised")
+WS_SEND_QUEUE_DEPTH = Gauge("ws_send_queue_depth", "Frames waiting in per-socket outbound queues")
+WS_CONNECTIONS_SHED = Counter("ws_connections_shed_total", "WebSocket handshakes refused at WS_MAX_CONNECTIONS")
+RATE_LIMITED = Counter("rate_limited_total", "Requests, frames and handshakes refused by a rate limit", ["bucket"])
+CHAT_MESSAGES = Counter("chat_messages_total", "Chat messages fanned out by ConnectionManager")
+PUBSUB_RECONNECTS = Counter("pubsub_reconnects_total", "Times the Redis pub/sub listener lost its connection")
+
+MESSAGE_WRITER_QUEUE_DEPTH = Gauge("message_writer_queue_depth", "Messages waiting for the batch writer")
+MESSAGE_WRITER_BATCH_SIZE = Histogram(
+    "message_writer_batch_size",
+    "Messages per batched INSERT",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 200, 500, 1000),
+)
+
+USER_CACHE_REQUESTS = Counter(
+    "user_cache_requests_total",
+    "User cache lookups by kind (user or page) and result (hit or miss)",
+    ["kind", "result"],
+)
+
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "SQL statement latency by statement type",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+DB_READ_SESSIONS = Counter("db_read_sessions_total", "Read-only request sessions by database they were routed to", ["target"])
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "SQL statements that raised", ["operation"])
+
+SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+
+def _operation(statement: str) -> str:
+    head = statement[:16].split(None, 1)
+    operation = head[0].upper() if head else ""
+    return operation if operation in SQL_OPERATIONS else "OTHER"
+
+
+def instrument_engine(engine: Engine):
+    """Count and time every statement through SQLAlchemy cursor events."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start_time"].pop()
+        DB_QUERY_DURATION.labels(_operation(statement)).observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        starts = context.connection.info.get("query_start_time") if context.connection else None
+        if starts:
+            starts.pop()
+        DB_QUERY_ERRORS.labels(_operation(context.statement or "")).inc()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and in-flight count per route template.
+
+    Labels use the matched route's path template (e.g. /api/v1/users/{user_id})
+    so cardinality stays bounded; unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"],
+                getattr(route, "path_format", "unmatched"),
+                str(status["code"]),
+            ).observe(time.perf_counter() - started)
@@ -0,0 +1,142 @@
+"""Keep a user's reads on the primary database for a short while after they write.
+
+Replicas lag the primary, so a user who has just changed something and
+reads it back from a replica could see the old state. crud marks every
+user a write touches (sender and receiver of a message or request, the
+owner of a notification); read-only requests about a recently marked user
+are served by the primary. Marks are kept server-side so they cover the
+WebSocket and non-browser clients too.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional, Set
+
+from fastapi import Request
+
+from app.core import config
+from app.core.database import replica_engines
+
+logger = logging.getLogger(__name__)
+
+# Request parameters naming the user a read-only endpoint answers for
+READER_PARAMS = ("user_id", "current_user_id")
+
+
+class RecentWriters:
+    """No replicas: every read already goes to the primary, nothing to track."""
+
+    def mark(self, user_ids: Iterable[int]):
+        pass
+
+    def wrote_recently(self, user_id: int) -> bool:
+        return False
+
+
+class LocalRecentWriters(RecentWriters):
+    """Per-worker marks; enough when a single worker serves a user's requests."""
+
+    def __init__(self, window: float, max_users: int):
+        self.window = window
+        self.max_users = max_users
+        self._deadlines: "OrderedDict[int, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def mark(self, user_ids: Iterable[int]):
+        deadline = time.monotonic() + self.window
+        with self._lock:
+            for user_id in user_ids:
+                self._deadlines[user_id] = deadline
+                self._deadlines.move_to_end(user_id)
+            while len(self._deadlines) > self.max_users:
+                self._deadlines.popitem(last=False)
+
+    def wrote_recently(self, user_id: int) -> bool:
+        deadline = self._deadlines.get(user_id)
+        return deadline is not None and deadline > time.monotonic()
+
+
+class RedisRecentWriters(RecentWriters):
+    """Marks shared by every worker as keys expiring after the window.
+
+    crud marks writers from inside transactions, some of which run on the
+    event loop (the WebSocket path, the message batch writer), so mark()
+    only queues the ids; one background thread writes them to Redis in a
+    pipeline. If Redis is unreachable, reads go to the primary: that costs
+    load, not correctness.
+    """
+
+    PREFIX = "wrote:"
+
+    def __init__(self, url: str, window: float):
+        import redis
+
+        self.redis = redis.Redis.from_url(url, decode_responses=True, socket_timeout=0.5)
+        self.errors = redis.RedisError
+        self.window_ms = max(1, int(window * 1000))
+        self._pending: Set[int] = set()
+        self._flushing = False
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recent-writers")
+
+    def mark(self, user_ids: Iterable[int]):
+        with self._lock:
+            self._pending.update(user_ids)
+            if self._flushing or not self._pending:
+                return
+            self._flushing = True
+        self._executor.submit(self._flush)
+
+    def _flush(self):
+        # Marks queued while a pipeline is in flight go out in the next one
+        while True:
+            with self._lock:
+                user_ids, self._pending = self._pending, set()
+                if not user_ids:
+                    self._flushing = False
+                    return
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for user_id in user_ids:
+                    pipe.set(f"{self.PREFIX}{user_id}", 1, px=self.window_ms)
+                pipe.execute()
+            except self.errors:
+                logger.warning("recent_writers_unavailable", exc_info=True)
+
+    def wrote_recently(self, user_id: int) -> bool:
+        try:
+            return bool(self.redis.exists(f"{self.PREFIX}{user_id}"))
+        except self.errors:
+            logger.warning("recent_writers_unavailable", exc_info=True)
+            return True
+
+
+def create_recent_writers() -> RecentWriters:
+    if not replica_engines or config.READ_YOUR_WRITES_SECONDS <= 0:
+        return RecentWriters()
+    if config.READ_YOUR_WRITES_BACKEND == "redis":
+        return RedisRecentWriters(config.REDIS_URL, config.READ_YOUR_WRITES_SECONDS)
+    if config.READ_YOUR_WRITES_BACKEND != "memory":
+        raise ValueError(f"Unknown READ_YOUR_WRITES_BACKEND: {config.READ_YOUR_WRITES_BACKEND}")
+    return LocalRecentWriters(config.READ_YOUR_WRITES_SECONDS, config.READ_YOUR_WRITES_MAX_USERS)
+
+
+recent_writers = create_recent_writers()
+
+
+def reader_id(request: Request) -> Optional[int]:
+    for name in READER_PARAMS:
+        value = request.path_params.get(name, request.query_params.get(name))
+        if value is not None:
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+def must_read_primary(request: Request) -> bool:
+    user_id = reader_id(request)
+    return user_id is not None and recent_writers.wrote_recently(user_id)
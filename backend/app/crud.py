@@ -1,26 +1,192 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from . import models, schemas
-from typing import List
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import Float, and_, case, cast, column, delete, func, insert, literal, literal_column, or_, select, table, text, true, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
+from . import message_archive, models, schemas
+from .connection_cache import connection_cache
+from .core.database import replica_of
+from .core.read_your_writes import recent_writers
+from .user_cache import user_cache
+from collections import namedtuple
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+import datetime
+import re
+
+UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+def increment_counter(db: Session, model, keys: dict, **deltas):
+    """Add deltas to a counter row in the caller's transaction, creating it if missing."""
+    table = model.__table__
+    dialect_insert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is not None:
+        stmt = dialect_insert(table).values(**keys, **{k: max(v, 0) for k, v in deltas.items()})
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={k: table.c[k] + v for k, v in deltas.items()}
+        )
+        db.execute(stmt)
+        return
+    result = db.execute(
+        update(table)
+        .where(*(table.c[k] == v for k, v in keys.items()))
+        .values({k: table.c[k] + v for k, v in deltas.items()})
+    )
+    if result.rowcount == 0:
+        db.execute(insert(table).values(**keys, **{k: max(v, 0) for k, v in deltas.items()}))
+
+NOTIFICATIONS_VERSION = "notifications_version"
+CONNECTIONS_VERSION = "connections_version"
+
+def bump_versions(db: Session, column: str, user_ids: Iterable[int]):
+    """Bump one UserVersion stamp for each user in the caller's transaction.
+
+    The users are also marked as recent writers, keeping their reads on the
+    primary while replicas catch up.
+    """
+    user_ids = sorted(set(user_ids))
+    for user_id in user_ids:
+        increment_counter(db, models.UserVersion, {"user_id": user_id}, **{column: 1})
+    recent_writers.mark(user_ids)
+
+def get_version(db: Session, user_id: int, column: str) -> int:
+    """Current stamp for user_id; users that were never bumped are at 0."""
+    return db.execute(
+        select(models.UserVersion.__table__.c[column]).where(models.UserVersion.user_id == user_id)
+    ).scalar() or 0
+
+def bump_all_versions(db: Session):
+    """Bump every user's stamps, e.g. after rows were loaded or rebuilt behind crud's back."""
+    UserVersion = models.UserVersion
+    db.execute(update(UserVersion).values(
+        notifications_version=UserVersion.notifications_version + 1,
+        connections_version=UserVersion.connections_version + 1
+    ))
+    db.execute(
+        insert(UserVersion).from_select(
+            ["user_id", "notifications_version", "connections_version"],
+            select(models.User.id, literal(1), literal(1)).where(
+                ~select(UserVersion.user_id).where(UserVersion.user_id == models.User.id).exists()
+            )
+        )
+    )
+
+PREVIEW_LENGTH = 100
+
+# Columns of schemas.MessageOut and schemas.NotificationOut, in field order.
+# List endpoints select just these and encode the rows directly.
+MESSAGE_OUT_COLUMNS = (
+    models.Message.id,
+    models.Message.sender_id,
+    models.Message.receiver_id,
+    models.Message.content,
+    models.Message.created_at,
+)
+# Archived messages are read back as ORM objects; this gives them the rows' shape
+ArchivedMessageRow = namedtuple("ArchivedMessageRow", [c.key for c in MESSAGE_OUT_COLUMNS])
+NOTIFICATION_OUT_COLUMNS = (
+    models.Notification.id,
+    models.Notification.user_id,
+    models.Notification.type,
+    models.Notification.title,
+    models.Notification.message,
+    models.Notification.is_read,
+    models.Notification.created_at,
+    models.Notification.message_count,
+    models.Notification.related_user_id,
+    models.Notification.related_request_id,
+    models.Notification.related_message_id,
+)
+
+REQUEST_NOTIFICATION_TEXT = {
+    schemas.NotificationType.connection_request: ("New Connection Request", "{username} wants to connect with you"),
+    schemas.NotificationType.connection_accepted: ("Connection Request Accepted", "{username} accepted your connection request"),
+    schemas.NotificationType.connection_rejected: ("Connection Request Rejected", "{username} declined your connection request"),
+}
+
+STATUS_NOTIFICATION_TYPES = {
+    schemas.RequestStatus.accepted: schemas.NotificationType.connection_accepted,
+    schemas.RequestStatus.rejected: schemas.NotificationType.connection_rejected,
+}
+
+def insert_returning(db: Session, model, rows: List[dict]) -> list:
+    """Insert rows with one multi-row INSERT ... RETURNING, in the caller's transaction.
+
+    The returned objects are in the same order as ``rows``.
+    """
+    if not rows:
+        return []
+    # PostgreSQL can tie RETURNING rows back to their parameters itself. On
+    # SQLite, asking for that would fall back to one INSERT per row; a single
+    # multi-row INSERT there assigns ids in VALUES order, so sort by id instead.
+    ordered = db.get_bind().dialect.name != "sqlite"
+    objects = db.scalars(
+        insert(model).returning(model, sort_by_parameter_order=ordered),
+        rows
+    ).all()
+    if not ordered:
+        objects.sort(key=lambda obj: obj.id)
+    return objects
+
+def commit_and_reload(db: Session, *groups: list):
+    """Commit, then re-read each group of objects with one IN query.
+
+    Saves the per-object SELECT that touching an expired instance would cost.
+    """
+    ids = [(group, [obj.id for obj in group]) for group in groups if group]
+    db.commit()
+    for group, group_ids in ids:
+        model = type(group[0])
+        db.query(model).filter(model.id.in_(group_ids)).all()
+
+def conversation_key(user1_id: int, user2_id: int) -> dict:
+    return {"user_low_id": min(user1_id, user2_id), "user_high_id": max(user1_id, user2_id)}
 
 def create_user(db: Session, user: schemas.UserCreate):
     db_user = models.User(username=user.username)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    user_cache.invalidate_user(db_user.id)
+    recent_writers.mark([db_user.id])
     return db_user
 
-def get_user(db: Session, user_id: int):
-    return db.query(models.User).filter(models.User.id == user_id).first()
+def get_user(db: Session, user_id: int) -> Optional[schemas.UserOut]:
+    """Snapshot of a user, served from user_cache when possible."""
+    cached = user_cache.get_user(user_id)
+    if cached is not None:
+        return cached
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if user is None:
+        return None
+    return user_cache.put_user(user)
 
 def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.User).offset(skip).limit(limit).all()
+def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[schemas.UserOut]:
+    key = user_cache.page_key(skip, limit)
+    cached = user_cache.get_page(key)
+    if cached is not None:
+        return cached
+    users = db.execute(
+        select(models.User.id, models.User.username).order_by(models.User.id).offset(skip).limit(limit)
+    ).all()
+    # A page read from a lagging replica may be missing users created since
+    # the generation was bumped, so only primary reads are cached
+    return user_cache.put_page(key if replica_of(db) is None else None, users)
 
-def get_user_connections(db: Session, user_id: int):
-    connection_requests = db.query(models.ConnectionRequest).filter(
+def get_users_by_ids(db: Session, user_ids: Iterable[int]) -> Dict[int, models.User]:
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+    users = db.query(models.User).filter(models.User.id.in_(user_ids)).all()
+    return {user.id: user for user in users}
+
+def connected_user_ids_query(user_id: int):
+    return select(models.ConnectionRequest.sender_id, models.ConnectionRequest.receiver_id).where(
         and_(
             or_(
                 models.ConnectionRequest.sender_id == user_id,
@@ -28,20 +194,29 @@ def get_user_connections(db: Session, user_id: int):
             ),
             models.ConnectionRequest.status == schemas.RequestStatus.accepted
         )
-    ).all()
-    
-    connected_user_ids = []
-    for request in connection_requests:
-        if request.sender_id == user_id:
-            connected_user_ids.append(request.receiver_id)
-        else:
-            connected_user_ids.append(request.sender_id)
-    
-    connected_users = db.query(models.User).filter(
-        models.User.id.in_(connected_user_ids)
-    ).all()
-    
-    return connected_users
+    )
+
+def other_user_ids(rows, user_id: int) -> FrozenSet[int]:
+    return frozenset(
+        receiver_id if sender_id == user_id else sender_id
+        for sender_id, receiver_id in rows
+    )
+
+def load_connected_user_ids(db: Session, user_id: int) -> FrozenSet[int]:
+    """Read a user's accepted connections from the database and refresh the cache.
+
+    Reads from a replica are not cached: a lagging replica could otherwise
+    put back an edge this worker has just removed.
+    """
+    token = connection_cache.load_token()
+    connected_ids = other_user_ids(db.execute(connected_user_ids_query(user_id)).all(), user_id)
+    if replica_of(db) is None:
+        connection_cache.put(user_id, connected_ids, token)
+    return connected_ids
+
+def get_user_connections(db: Session, user_id: int):
+    connected_user_ids = load_connected_user_ids(db, user_id)
+    return list(get_users_by_ids(db, connected_user_ids).values())
 
 def get_user_sent_requests(db: Session, user_id: int):
     return db.query(models.ConnectionRequest).filter(
@@ -63,21 +238,117 @@ def send_request(db: Session, sender_id: int, receiver_id: int):
     
     req = models.ConnectionRequest(sender_id=sender_id, receiver_id=receiver_id)
     db.add(req)
+    bump_versions(db, CONNECTIONS_VERSION, (sender_id, receiver_id))
     db.commit()
     db.refresh(req)
     return req
 
+def send_requests(db: Session, sender: models.User, receiver_ids: List[int]):
+    """Send requests from sender to many receivers in one transaction.
+
+    New requests and their notifications are each inserted with a single
+    statement. Returns ({receiver_id: (BatchItemStatus, request)}, notifications).
+    """
+    receiver_ids = list(dict.fromkeys(receiver_ids))
+    receivers = get_users_by_ids(db, receiver_ids)
+    existing = {
+        req.receiver_id: req
+        for req in db.query(models.ConnectionRequest).filter(
+            models.ConnectionRequest.sender_id == sender.id,
+            models.ConnectionRequest.receiver_id.in_(receiver_ids)
+        )
+    }
+    
+    results = {}
+    new_receiver_ids = []
+    for receiver_id in receiver_ids:
+        if receiver_id == sender.id:
+            results[receiver_id] = (schemas.BatchItemStatus.invalid, None)
+        elif receiver_id not in receivers:
+            results[receiver_id] = (schemas.BatchItemStatus.not_found, None)
+        elif receiver_id in existing:
+            results[receiver_id] = (schemas.BatchItemStatus.exists, existing[receiver_id])
+        else:
+            new_receiver_ids.append(receiver_id)
+    
+    created = insert_returning(db, models.ConnectionRequest, [
+        {"sender_id": sender.id, "receiver_id": receiver_id} for receiver_id in new_receiver_ids
+    ])
+    for req in created:
+        results[req.receiver_id] = (schemas.BatchItemStatus.created, req)
+    if created:
+        bump_versions(db, CONNECTIONS_VERSION, [sender.id] + new_receiver_ids)
+    notifications = create_notifications(db, [
+        request_notification(schemas.NotificationType.connection_request, req.receiver_id, sender, req)
+        for req in created
+    ])
+    commit_and_reload(db, created + list(existing.values()), notifications)
+    return results, notifications
+
 def get_connection_request(db: Session, request_id: int):
     return db.query(models.ConnectionRequest).filter(models.ConnectionRequest.id == request_id).first()
 
 def update_request(db: Session, request_id: int, status: schemas.RequestStatus):
     req = db.query(models.ConnectionRequest).filter(models.ConnectionRequest.id == request_id).first()
     if req:
+        previous_status = req.status
         req.status = status
+        if previous_status != status:
+            bump_versions(db, CONNECTIONS_VERSION, (req.sender_id, req.receiver_id))
         db.commit()
         db.refresh(req)
+        if status == schemas.RequestStatus.accepted and previous_status != status:
+            connection_cache.add_connection(req.sender_id, req.receiver_id)
+        elif previous_status == schemas.RequestStatus.accepted and status != previous_status:
+            connection_cache.remove_connection(req.sender_id, req.receiver_id)
     return req
 
+def update_requests(db: Session, request_ids: List[int], status: schemas.RequestStatus):
+    """Move many requests to status in one transaction, notifying each sender.
+
+    Returns ({request_id: (BatchItemStatus, request)}, notifications).
+    """
+    request_ids = list(dict.fromkeys(request_ids))
+    found = {
+        req.id: req
+        for req in db.query(models.ConnectionRequest).filter(models.ConnectionRequest.id.in_(request_ids))
+    }
+    
+    results = {}
+    changed = []
+    for request_id in request_ids:
+        req = found.get(request_id)
+        if req is None:
+            results[request_id] = (schemas.BatchItemStatus.not_found, None)
+        elif req.status == status:
+            results[request_id] = (schemas.BatchItemStatus.unchanged, req)
+        else:
+            results[request_id] = (schemas.BatchItemStatus.updated, req)
+            changed.append(req)
+    
+    previous_status = {req.id: req.status for req in changed}
+    notifications = []
+    if changed:
+        db.query(models.ConnectionRequest).filter(
+            models.ConnectionRequest.id.in_(previous_status)
+        ).update({"status": status}, synchronize_session="evaluate")
+        bump_versions(db, CONNECTIONS_VERSION, [
+            user_id for req in changed for user_id in (req.sender_id, req.receiver_id)
+        ])
+        receivers = get_users_by_ids(db, {req.receiver_id for req in changed})
+        notifications = create_notifications(db, [
+            request_notification(STATUS_NOTIFICATION_TYPES[status], req.sender_id, receivers[req.receiver_id], req)
+            for req in changed
+        ])
+    commit_and_reload(db, list(found.values()), notifications)
+    
+    for req in changed:
+        if status == schemas.RequestStatus.accepted:
+            connection_cache.add_connection(req.sender_id, req.receiver_id)
+        elif previous_status[req.id] == schemas.RequestStatus.accepted:
+            connection_cache.remove_connection(req.sender_id, req.receiver_id)
+    return results, notifications
+
 def create_message(db: Session, sender_id: int, receiver_id: int, content: str):
     message = models.Message(
         sender_id=sender_id,
@@ -85,43 +356,332 @@ def create_message(db: Session, sender_id: int, receiver_id: int, content: str):
         content=content
     )
     db.add(message)
+    db.flush()
+    record_messages(db, [message])
     db.commit()
     db.refresh(message)
     return message
 
-def get_chat_history(db: Session, user1_id: int, user2_id: int, skip: int = 0, limit: int = 50):
-    messages = db.query(models.Message).filter(
-        or_(
-            and_(
-                models.Message.sender_id == user1_id,
-                models.Message.receiver_id == user2_id
-            ),
-            and_(
-                models.Message.sender_id == user2_id,
-                models.Message.receiver_id == user1_id
+def create_messages(db: Session, rows: List[dict]) -> List[models.Message]:
+    """Insert many messages with one multi-row INSERT ... RETURNING and one commit.
+
+    ``rows`` are dicts of sender_id, receiver_id and content; the returned
+    messages are in the same order.
+    """
+    messages = insert_returning(db, models.Message, rows)
+    record_messages(db, messages)
+    db.commit()
+    return messages
+
+def record_messages(db: Session, messages: List[models.Message]):
+    """Apply the bookkeeping every new message needs, in the caller's transaction."""
+    per_conversation: Dict[Tuple[int, int], int] = {}
+    latest: Dict[Tuple[int, int], models.Message] = {}
+    received: Dict[Tuple[int, int], int] = {}
+    for message in messages:
+        key = (min(message.sender_id, message.receiver_id), max(message.sender_id, message.receiver_id))
+        per_conversation[key] = per_conversation.get(key, 0) + 1
+        if key not in latest or message.id > latest[key].id:
+            latest[key] = message
+        inbox_key = (message.receiver_id, message.sender_id)
+        received[inbox_key] = received.get(inbox_key, 0) + 1
+    index_messages(db, messages)
+    recent_writers.mark({user_id for message in messages for user_id in (message.sender_id, message.receiver_id)})
+    # Fixed lock order so concurrent batches cannot deadlock on counter rows
+    for (low_id, high_id), count in sorted(per_conversation.items()):
+        increment_counter(
+            db, models.ConversationCounter,
+            {"user_low_id": low_id, "user_high_id": high_id}, message_count=count
+        )
+        for user_id, peer_id in ((low_id, high_id), (high_id, low_id)):
+            upsert_conversation_summary(
+                db, user_id, peer_id, latest[(low_id, high_id)], received.get((user_id, peer_id), 0)
             )
+
+def index_messages(db: Session, messages: List[models.Message]):
+    """Add new messages to the SQLite FTS5 index; PostgreSQL maintains its own."""
+    if db.get_bind().dialect.name == "sqlite" and messages:
+        db.execute(
+            text("INSERT INTO messages_fts (rowid, content) VALUES (:id, :content)"),
+            [{"id": message.id, "content": message.content} for message in messages]
+        )
+
+def rebuild_search_index(db: Session):
+    """Re-read every message into the SQLite FTS5 index, e.g. after a bulk load."""
+    if db.get_bind().dialect.name == "sqlite":
+        db.execute(text("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')"))
+        db.commit()
+
+def upsert_conversation_summary(db: Session, user_id: int, peer_id: int, message: models.Message, unread: int):
+    """Point user_id's inbox row for peer_id at message and add to its unread count.
+
+    Only moves the row forward: a message committed late with a lower id than
+    the one already shown still counts as unread but does not replace it.
+    """
+    table = models.ConversationSummary.__table__
+    last = {
+        "last_message_id": message.id,
+        "last_sender_id": message.sender_id,
+        "last_message_preview": message.content[:PREVIEW_LENGTH],
+        "last_message_at": message.created_at,
+    }
+    newer = table.c.last_message_id < message.id
+    changes = {k: case((newer, v), else_=table.c[k]) for k, v in last.items()}
+    changes["unread_count"] = table.c.unread_count + unread
+    
+    dialect_insert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is not None:
+        stmt = dialect_insert(table).values(user_id=user_id, peer_id=peer_id, unread_count=unread, **last)
+        db.execute(stmt.on_conflict_do_update(index_elements=["user_id", "peer_id"], set_=changes))
+        return
+    result = db.execute(
+        update(table).where(table.c.user_id == user_id, table.c.peer_id == peer_id).values(changes)
+    )
+    if result.rowcount == 0:
+        db.execute(insert(table).values(user_id=user_id, peer_id=peer_id, unread_count=unread, **last))
+
+def conversation_filter(user1_id: int, user2_id: int):
+    return or_(
+        and_(
+            models.Message.sender_id == user1_id,
+            models.Message.receiver_id == user2_id
+        ),
+        and_(
+            models.Message.sender_id == user2_id,
+            models.Message.receiver_id == user1_id
         )
-    ).order_by(models.Message.created_at.asc()).offset(skip).limit(limit).all()
+    )
+
+def get_chat_history(db: Session, user1_id: int, user2_id: int, skip: int = 0, limit: int = 50):
+    """Rows of MESSAGE_OUT_COLUMNS, oldest first.
+
+    Archived months are older than every live row, so the offset runs
+    through the conversation's archived rows first; their count comes from
+    the database, and segment files are only read for pages that reach
+    into them.
+    """
+    archived_total = message_archive.archived_count(db, user1_id, user2_id)
+    messages = []
+    if skip < archived_total:
+        archived = message_archive.archived_slice(db, user1_id, user2_id, skip, limit)
+        messages = [ArchivedMessageRow(*(getattr(m, c.key) for c in MESSAGE_OUT_COLUMNS)) for m in archived]
+    if len(messages) < limit:
+        messages += db.execute(
+            select(*MESSAGE_OUT_COLUMNS).where(
+                conversation_filter(user1_id, user2_id)
+            ).order_by(models.Message.created_at.asc())
+            .offset(max(0, skip - archived_total)).limit(limit - len(messages))
+        ).all()
     
     return messages
 
-def check_users_connected(db: Session, user1_id: int, user2_id: int) -> bool:
-    connection = db.query(models.ConnectionRequest).filter(
-        or_(
-            and_(
-                models.ConnectionRequest.sender_id == user1_id,
-                models.ConnectionRequest.receiver_id == user2_id,
-                models.ConnectionRequest.status == schemas.RequestStatus.accepted
-            ),
-            and_(
-                models.ConnectionRequest.sender_id == user2_id,
-                models.ConnectionRequest.receiver_id == user1_id,
-                models.ConnectionRequest.status == schemas.RequestStatus.accepted
+def count_chat_messages(db: Session, user1_id: int, user2_id: int) -> int:
+    counter = db.get(models.ConversationCounter, conversation_key(user1_id, user2_id))
+    return counter.message_count if counter else 0
+
+def get_chat_history_page(
+    db: Session,
+    user1_id: int,
+    user2_id: int,
+    limit: int = 50,
+    before: Optional[Tuple[datetime.datetime, int]] = None,
+    after: Optional[Tuple[datetime.datetime, int]] = None
+):
+    """Keyset page of a conversation on (created_at, id), newest first.
+
+    ``before`` walks back into older messages, ``after`` forward into newer
+    ones. Fetches one extra row so the caller can tell whether more exist.
+    Returns (messages, has_more).
+    """
+    query = db.query(models.Message).filter(conversation_filter(user1_id, user2_id))
+    
+    if after is not None:
+        created_at, message_id = after
+        # The inclusive bound on created_at alone is what the index can seek on
+        query = query.filter(
+            models.Message.created_at >= created_at,
+            or_(models.Message.created_at > created_at, models.Message.id > message_id)
+        ).order_by(models.Message.created_at.asc(), models.Message.id.asc())
+    else:
+        if before is not None:
+            created_at, message_id = before
+            query = query.filter(
+                models.Message.created_at <= created_at,
+                or_(models.Message.created_at < created_at, models.Message.id < message_id)
+            )
+        query = query.order_by(models.Message.created_at.desc(), models.Message.id.desc())
+    
+    messages = query.limit(limit + 1).all()
+    
+    # Months moved to archive segments are no longer in the table. Going
+    # back, the archive is only read once the cursor has passed the live
+    # rows: it is older than the newest archived month, or this page found
+    # no live rows at all. A short page before that just reports whether
+    # the conversation has archived rows, so the client pages on into them.
+    # Going forward, it is read while the cursor is older than that month.
+    has_archived = False
+    if after is None and len(messages) <= limit:
+        horizon = message_archive.archive_horizon(db)
+        edge = (messages[-1].created_at, messages[-1].id) if messages else before
+        if horizon is not None and (not messages or edge[0] < horizon):
+            messages += message_archive.archived_page(
+                db, user1_id, user2_id, limit + 1 - len(messages), before=edge
             )
+        elif horizon is not None:
+            has_archived = message_archive.archived_count(db, user1_id, user2_id) > 0
+    elif after is not None:
+        horizon = message_archive.archive_horizon(db)
+        if horizon is not None and after[0] < horizon:
+            archived = message_archive.archived_page(db, user1_id, user2_id, limit + 1, after=after)
+            messages = (archived + messages)[:limit + 1]
+    
+    has_more = len(messages) > limit or has_archived
+    messages = messages[:limit]
+    if after is not None:
+        messages.reverse()
+    return messages, has_more
+
+def get_inbox(
+    db: Session,
+    user_id: int,
+    limit: int = 50,
+    before: Optional[Tuple[datetime.datetime, int]] = None
+):
+    """Keyset page of a user's conversations, most recent activity first.
+
+    Returns ([(summary, peer_username)], has_more).
+    """
+    Summary = models.ConversationSummary
+    query = db.query(Summary, models.User.username).join(
+        models.User, models.User.id == Summary.peer_id
+    ).filter(Summary.user_id == user_id)
+    
+    if before is not None:
+        last_message_at, peer_id = before
+        query = query.filter(
+            Summary.last_message_at <= last_message_at,
+            or_(Summary.last_message_at < last_message_at, Summary.peer_id < peer_id)
         )
-    ).first()
     
-    return connection is not None
+    rows = query.order_by(Summary.last_message_at.desc(), Summary.peer_id.desc()).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+def mark_conversation_read(db: Session, user_id: int, peer_id: int) -> bool:
+    result = db.execute(
+        update(models.ConversationSummary)
+        .where(
+            models.ConversationSummary.user_id == user_id,
+            models.ConversationSummary.peer_id == peer_id
+        )
+        .values(unread_count=0)
+    )
+    db.commit()
+    recent_writers.mark([user_id])
+    return result.rowcount > 0
+
+def search_terms(query: str) -> str:
+    """Quote each word so FTS5 treats user input as plain terms, all required."""
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", query))
+
+def search_messages(
+    db: Session,
+    user_id: int,
+    query: str,
+    limit: int = 20,
+    after: Optional[Tuple[float, int]] = None,
+    with_user_id: Optional[int] = None
+):
+    """Messages matching query in the user's conversations with connected users.
+
+    Ranked best first by the database's text rank, then id; ``after`` is the
+    (score, id) of the last hit of the previous page. Returns
+    ([(message, score)], has_more).
+    """
+    Message = models.Message
+    peer_ids = load_connected_user_ids(db, user_id)
+    if with_user_id is not None:
+        peer_ids = peer_ids & {with_user_id}
+    terms = search_terms(query)
+    if not peer_ids or not terms:
+        return [], False
+    
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        tsquery = func.plainto_tsquery("simple", query)
+        content_tsv = literal_column("messages.content_tsv")
+        # ts_rank is float4; as float8 it round-trips exactly through the
+        # cursor, so the keyset comparison below sees ties as equal
+        score = cast(func.ts_rank(content_tsv, tsquery), Float(53))
+        search = db.query(Message, score).filter(content_tsv.op("@@")(tsquery))
+    elif dialect == "sqlite":
+        fts = table("messages_fts", column("rowid"))
+        fts_name = literal_column("messages_fts")
+        hits = select(
+            fts.c.rowid.label("id"), (-func.bm25(fts_name)).label("score")
+        ).where(fts_name.op("MATCH")(terms)).subquery()
+        score = hits.c.score
+        search = db.query(Message, score).join(hits, hits.c.id == Message.id)
+    else:
+        # No full-text index here: match every term with LIKE, unranked
+        score = literal(0.0, Float(53))
+        search = db.query(Message, score).filter(
+            *(Message.content.ilike(f"%{word}%") for word in re.findall(r"\w+", query))
+        )
+    
+    search = search.filter(or_(
+        and_(Message.sender_id == user_id, Message.receiver_id.in_(peer_ids)),
+        and_(Message.receiver_id == user_id, Message.sender_id.in_(peer_ids))
+    ))
+    if after is not None:
+        last_score, last_id = after
+        search = search.filter(or_(score < last_score, and_(score == last_score, Message.id < last_id)))
+    
+    rows = search.order_by(score.desc(), Message.id.desc()).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+def missed_messages_query(
+    user_id: int,
+    last_seen_id: Optional[int],
+    last_seen_by_peer: Dict[int, int],
+    after_id: int,
+    up_to_id: int,
+    limit: int
+):
+    """Next batch of messages to or from user_id that the client has not seen.
+
+    Conversations in last_seen_by_peer resume after their own id; every other
+    conversation resumes after last_seen_id, or is skipped when it is None.
+    Batches are keyed on id: pass the last id returned as after_id.
+    """
+    Message = models.Message
+    ranges = [
+        and_(conversation_filter(user_id, peer_id), Message.id > seen_id)
+        for peer_id, seen_id in last_seen_by_peer.items()
+    ]
+    if last_seen_id is not None:
+        others = and_(or_(Message.sender_id == user_id, Message.receiver_id == user_id), Message.id > last_seen_id)
+        if last_seen_by_peer:
+            peer_ids = list(last_seen_by_peer)
+            others = and_(others, Message.sender_id.notin_(peer_ids), Message.receiver_id.notin_(peer_ids))
+        ranges.append(others)
+    return select(Message).where(
+        or_(*ranges), Message.id > after_id, Message.id <= up_to_id
+    ).order_by(Message.id).limit(limit)
+
+def cached_users_connected(user1_id: int, user2_id: int) -> bool:
+    """True when either user's cached adjacency already contains the other."""
+    for user_id, other_id in ((user1_id, user2_id), (user2_id, user1_id)):
+        connected_ids = connection_cache.get(user_id)
+        if connected_ids is not None and other_id in connected_ids:
+            return True
+    return False
+
+def check_users_connected(db: Session, user1_id: int, user2_id: int) -> bool:
+    if cached_users_connected(user1_id, user2_id):
+        return True
+    # A miss or a cached "no" (possibly stale if another worker accepted the
+    # request) is answered from the database, which also refreshes the cache.
+    return user2_id in load_connected_user_ids(db, user1_id)
 
 def get_user_connected_users(db: Session, user_id: int):
     connected_users = get_user_connections(db, user_id)
@@ -147,41 +707,138 @@ def create_notification(
         related_message_id=related_message_id
     )
     db.add(db_notification)
+    increment_counter(db, models.NotificationCounter, {"user_id": user_id}, total_count=1, unread_count=1)
+    bump_versions(db, NOTIFICATIONS_VERSION, [user_id])
     db.commit()
     db.refresh(db_notification)
     return db_notification
 
+def notify_new_message(
+    db: Session,
+    user_id: int,
+    sender_id: int,
+    title: str,
+    preview: str,
+    message_id: int
+) -> models.Notification:
+    """Record an offline message for user_id, folding it into any unread one from sender_id.
+
+    The UPDATE is tried first; if there is nothing to fold into, the INSERT
+    runs in a savepoint so that a concurrent insert of the same row, caught
+    by ux_notifications_unread_new_message, turns into another UPDATE. The
+    counters only move when a row is actually inserted.
+    """
+    Notification = models.Notification
+    coalesce = update(Notification).where(
+        Notification.user_id == user_id,
+        Notification.related_user_id == sender_id,
+        Notification.type == schemas.NotificationType.new_message,
+        Notification.is_read == False
+    ).values(
+        message_count=Notification.message_count + 1,
+        title=title,
+        message=preview,
+        related_message_id=message_id,
+        created_at=datetime.datetime.utcnow()
+    ).returning(Notification.id).execution_options(synchronize_session=False)
+    
+    for _ in range(3):
+        notification_id = db.execute(coalesce).scalar()
+        if notification_id is not None:
+            break
+        try:
+            with db.begin_nested():
+                notification = Notification(
+                    user_id=user_id,
+                    type=schemas.NotificationType.new_message,
+                    title=title,
+                    message=preview,
+                    related_user_id=sender_id,
+                    related_message_id=message_id
+                )
+                db.add(notification)
+                db.flush()
+                increment_counter(db, models.NotificationCounter, {"user_id": user_id}, total_count=1, unread_count=1)
+            notification_id = notification.id
+            break
+        except IntegrityError:
+            continue
+    else:
+        raise RuntimeError(f"Could not record new_message notification for user {user_id}")
+    
+    bump_versions(db, NOTIFICATIONS_VERSION, [user_id])
+    db.commit()
+    return db.get(Notification, notification_id)
+
+def request_notification_text(notification_type: schemas.NotificationType, username: str) -> Tuple[str, str]:
+    title, message = REQUEST_NOTIFICATION_TEXT[notification_type]
+    return title, message.format(username=username)
+
+def request_notification(
+    notification_type: schemas.NotificationType,
+    user_id: int,
+    actor: models.User,
+    request: models.ConnectionRequest
+) -> dict:
+    """Notification row telling user_id that actor acted on request."""
+    title, message = request_notification_text(notification_type, actor.username)
+    return {
+        "user_id": user_id,
+        "type": notification_type,
+        "title": title,
+        "message": message,
+        "related_user_id": actor.id,
+        "related_request_id": request.id,
+    }
+
+def create_notifications(db: Session, rows: List[dict]) -> List[models.Notification]:
+    """Insert many notifications and bump their counters in the caller's transaction."""
+    notifications = insert_returning(db, models.Notification, rows)
+    per_user: Dict[int, int] = {}
+    for notification in notifications:
+        per_user[notification.user_id] = per_user.get(notification.user_id, 0) + 1
+    for user_id, count in sorted(per_user.items()):
+        increment_counter(db, models.NotificationCounter, {"user_id": user_id}, total_count=count, unread_count=count)
+    bump_versions(db, NOTIFICATIONS_VERSION, per_user)
+    return notifications
+
 def get_user_notifications(db: Session, user_id: int, skip: int = 0, limit: int = 50, unread_only: bool = False):
-    query = db.query(models.Notification).filter(models.Notification.user_id == user_id)
+    """Rows of NOTIFICATION_OUT_COLUMNS, newest first."""
+    query = select(*NOTIFICATION_OUT_COLUMNS).where(models.Notification.user_id == user_id)
     
     if unread_only:
-        query = query.filter(models.Notification.is_read == False)
+        query = query.where(models.Notification.is_read == False)
     
     query = query.order_by(models.Notification.created_at.desc())
     
-    return query.offset(skip).limit(limit).all()
+    return db.execute(query.offset(skip).limit(limit)).all()
 
 def get_notification_count(db: Session, user_id: int):
-    total_count = db.query(models.Notification).filter(models.Notification.user_id == user_id).count()
-    unread_count = db.query(models.Notification).filter(
-        models.Notification.user_id == user_id,
-        models.Notification.is_read == False
-    ).count()
-    
-    return {"total_count": total_count, "unread_count": unread_count}
+    counter = db.get(models.NotificationCounter, user_id)
+    if counter is None:
+        return {"total_count": 0, "unread_count": 0}
+    return {"total_count": counter.total_count, "unread_count": counter.unread_count}
 
 def mark_notifications_as_read(db: Session, user_id: int, notification_ids: List[int]):
-    db.query(models.Notification).filter(
+    marked = db.query(models.Notification).filter(
         models.Notification.user_id == user_id,
-        models.Notification.id.in_(notification_ids)
+        models.Notification.id.in_(notification_ids),
+        models.Notification.is_read == False
     ).update({"is_read": True}, synchronize_session=False)
+    if marked:
+        increment_counter(db, models.NotificationCounter, {"user_id": user_id}, unread_count=-marked)
+        bump_versions(db, NOTIFICATIONS_VERSION, [user_id])
     db.commit()
     return True
 
 def mark_all_notifications_as_read(db: Session, user_id: int):
-    db.query(models.Notification).filter(
-        models.Notification.user_id == user_id
+    marked = db.query(models.Notification).filter(
+        models.Notification.user_id == user_id,
+        models.Notification.is_read == False
     ).update({"is_read": True}, synchronize_session=False)
+    if marked:
+        increment_counter(db, models.NotificationCounter, {"user_id": user_id}, unread_count=-marked)
+        bump_versions(db, NOTIFICATIONS_VERSION, [user_id])
     db.commit()
     return True
 
@@ -192,7 +849,83 @@ def delete_notification(db: Session, notification_id: int, user_id: int):
     ).first()
     
     if notification:
+        was_unread = not notification.is_read
         db.delete(notification)
+        increment_counter(
+            db, models.NotificationCounter, {"user_id": user_id},
+            total_count=-1, unread_count=-1 if was_unread else 0
+        )
+        bump_versions(db, NOTIFICATIONS_VERSION, [user_id])
         db.commit()
         return True
     return False
+
+def recompute_counters(db: Session):
+    """Rebuild every counter table from the source tables in one transaction."""
+    Message = models.Message
+    Notification = models.Notification
+    low_id = case((Message.sender_id < Message.receiver_id, Message.sender_id), else_=Message.receiver_id)
+    high_id = case((Message.sender_id < Message.receiver_id, Message.receiver_id), else_=Message.sender_id)
+    
+    db.execute(delete(models.ConversationCounter))
+    db.execute(
+        insert(models.ConversationCounter).from_select(
+            ["user_low_id", "user_high_id", "message_count"],
+            select(low_id, high_id, func.count()).group_by(low_id, high_id)
+        )
+    )
+    
+    db.execute(delete(models.NotificationCounter))
+    db.execute(
+        insert(models.NotificationCounter).from_select(
+            ["user_id", "total_count", "unread_count"],
+            select(
+                Notification.user_id,
+                func.count(),
+                func.sum(case((Notification.is_read == False, 1), else_=0))
+            ).group_by(Notification.user_id)
+        )
+    )
+    
+    rebuild_conversation_summaries(db)
+    # Counts may have moved under cached responses
+    bump_all_versions(db)
+    db.commit()
+
+def rebuild_conversation_summaries(db: Session):
+    """Point every inbox row at its conversation's newest message.
+
+    Read state is not stored on messages, so existing unread counts are kept
+    and rows created here start at zero.
+    """
+    Message = models.Message
+    Summary = models.ConversationSummary
+    sides = union_all(
+        select(Message.sender_id.label("user_id"), Message.receiver_id.label("peer_id"), Message.id),
+        select(Message.receiver_id, Message.sender_id, Message.id)
+    ).subquery()
+    latest = select(
+        sides.c.user_id, sides.c.peer_id, func.max(sides.c.id).label("message_id")
+    ).group_by(sides.c.user_id, sides.c.peer_id).subquery()
+    rows = select(
+        latest.c.user_id,
+        latest.c.peer_id,
+        Message.id,
+        Message.sender_id,
+        func.substr(Message.content, 1, PREVIEW_LENGTH),
+        Message.created_at,
+        literal(0)
+    ).join(Message, Message.id == latest.c.message_id).where(true())
+    columns = ["user_id", "peer_id", "last_message_id", "last_sender_id",
+               "last_message_preview", "last_message_at", "unread_count"]
+    
+    dialect_insert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is None:
+        db.execute(delete(Summary))
+        db.execute(insert(Summary).from_select(columns, rows))
+        return
+    stmt = dialect_insert(Summary).from_select(columns, rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id", "peer_id"],
+        set_={column: stmt.excluded[column] for column in columns[2:-1]}
+    ))
@@ -0,0 +1,48 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+
+from app import crud
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(request: Request, user_id: int, column: str, version: int) -> str:
+    """Weak ETag for one user's version stamp, varied by the URL it was served for."""
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    key = f"{request.url.path}?{query}|{user_id}|{column}"
+    digest = hashlib.blake2s(key.encode(), digest_size=8).hexdigest()
+    return f'W/"{version}-{digest}"'
+
+
+def matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against etag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def conditional(
+    db: Session,
+    request: Request,
+    response: Response,
+    user_id: int,
+    column: str
+) -> Optional[Response]:
+    """Tag response with user_id's current stamp, or return a 304 if the client already has it.
+
+    Call this before reading anything else: the stamp is read first, so a
+    write landing mid-request leaves the response tagged with the older
+    version and the next poll fetches it again rather than missing it.
+    """
+    etag = make_etag(request, user_id, column, crud.get_version(db, user_id, column))
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,42 @@
+from typing import Dict, Iterable, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from app import crud, models
+
+
+class UserLoader:
+    """Per-request batch loader for users.
+
+    Call want() with every id a response will need, then get(); all pending
+    ids are resolved with a single IN query on the first get(), instead of
+    one crud.get_user call per row.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._users: Dict[int, models.User] = {}
+        self._pending: Set[int] = set()
+
+    def want(self, user_ids: Iterable[Optional[int]]):
+        for user_id in user_ids:
+            if user_id is not None and user_id not in self._users:
+                self._pending.add(user_id)
+        return self
+
+    def load(self):
+        if self._pending:
+            self._users.update(crud.get_users_by_ids(self.db, self._pending))
+            self._pending.clear()
+
+    def get(self, user_id: Optional[int]) -> Optional[models.User]:
+        if user_id is None:
+            return None
+        if user_id not in self._users:
+            self._pending.add(user_id)
+            self.load()
+        return self._users.get(user_id)
+
+    def username(self, user_id: Optional[int]) -> Optional[str]:
+        user = self.get(user_id)
+        return user.username if user else None
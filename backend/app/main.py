@@ -1,11 +1,49 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import api_router
+from app.connection_cache import connection_cache
 from app.core.database import Base, engine
+from app.core import config
+from app.core.logging import setup_logging
+from app.core.metrics import MetricsMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from app.message_writer import message_writer
+from app.retention import retention_job
+from app.websocket_manager import manager
+
+setup_logging()
 
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Backend Assignment")
+def share_connection_edits():
+    """Patch every worker's connection cache when a connection is accepted or revoked.
+
+    check_users_connected authorizes chat from that cache, so another
+    worker must not keep a revoked edge until its entry expires.
+    """
+    connection_cache.on_edge_change = lambda user1_id, user2_id, connected: manager.broadcast(
+        "connection_edge", {"users": [user1_id, user2_id], "connected": connected}
+    )
+    manager.on_broadcast(
+        "connection_edge", lambda data: connection_cache.apply_edge(*data["users"], data["connected"])
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    share_connection_edits()
+    await manager.start()
+    if config.MESSAGE_BATCHING_ENABLED:
+        await message_writer.start()
+    if config.NOTIFICATION_RETENTION_INTERVAL_SECONDS > 0:
+        await retention_job.start()
+    yield
+    await retention_job.stop()
+    await message_writer.stop()
+    await manager.stop()
+
+app = FastAPI(title="Backend Assignment", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,8 +53,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(api_router, prefix="/api/v1")
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Becommune Backend Assignment API"}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
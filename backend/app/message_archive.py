@@ -0,0 +1,185 @@
+"""Cold storage for old chat messages.
+
+scripts/partition_messages.py exports a month of messages to a segment:
+``<name>.jsonl.gz`` plus ``<name>.index.json``. Each conversation is written
+as its own gzip member in (created_at, id) order, and the index maps the
+conversation to that member's byte offset, length and row count, so
+reading one conversation decompresses only its own rows. Segments are
+listed in message_archive_segments by absolute path, and the index is
+copied into message_archive_conversations so history reads look up a
+conversation's segments in the database instead of opening index files.
+A segment whose data file has gone missing is logged and read as empty.
+"""
+import datetime
+import gzip
+import itertools
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import models
+
+logger = logging.getLogger(__name__)
+
+SortKey = Tuple[datetime.datetime, int]
+
+
+def conversation_token(user1_id: int, user2_id: int) -> str:
+    return f"{min(user1_id, user2_id)}:{max(user1_id, user2_id)}"
+
+
+def data_path(base: str) -> str:
+    return base + ".jsonl.gz"
+
+
+def index_path(base: str) -> str:
+    return base + ".index.json"
+
+
+def write_segment(base: str, rows: Iterable[dict]) -> Dict[str, List[int]]:
+    """Write rows, grouped by conversation, to a segment; returns its index.
+
+    Rows are dicts of id, sender_id, receiver_id, content and created_at and
+    must already be sorted by conversation, then (created_at, id).
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(base)), exist_ok=True)
+    index: Dict[str, List[int]] = {}
+    count = 0
+    with open(data_path(base), "wb") as f:
+        grouped = itertools.groupby(rows, key=lambda row: conversation_token(row["sender_id"], row["receiver_id"]))
+        for token, group in grouped:
+            lines = []
+            for row in group:
+                lines.append(json.dumps({**row, "created_at": row["created_at"].isoformat()}))
+            member = gzip.compress(("\n".join(lines) + "\n").encode())
+            index[token] = [f.tell(), len(member), len(lines)]
+            f.write(member)
+            count += len(lines)
+    with open(index_path(base), "w") as f:
+        json.dump(index, f)
+    return index
+
+
+def load_index(base: str) -> Dict[str, List[int]]:
+    with open(index_path(base)) as f:
+        return json.load(f)
+
+
+def index_rows(segment_id: int, base: str, index: Dict[str, List[int]]) -> List[dict]:
+    """message_archive_conversations rows for a segment's index."""
+    rows = []
+    for token, (offset, length, *count) in index.items():
+        low_id, high_id = (int(part) for part in token.split(":"))
+        rows.append({
+            "low_user_id": low_id,
+            "high_user_id": high_id,
+            "segment_id": segment_id,
+            "byte_offset": offset,
+            "byte_length": length,
+            # Index files written before row counts were recorded
+            "row_count": count[0] if count else len(read_member(base, offset, length)),
+        })
+    return rows
+
+
+def read_member(base: str, offset: int, length: int) -> List[models.Message]:
+    """One conversation's messages from a segment, as detached Message objects."""
+    try:
+        with open(data_path(base), "rb") as f:
+            f.seek(offset)
+            member = f.read(length)
+    except FileNotFoundError:
+        logger.warning("archive_segment_missing", extra={"segment": base})
+        return []
+    messages = []
+    for line in gzip.decompress(member).decode().splitlines():
+        row = json.loads(line)
+        row["created_at"] = datetime.datetime.fromisoformat(row["created_at"])
+        messages.append(models.Message(**row))
+    return messages
+
+
+def archive_horizon(db: Session) -> Optional[datetime.datetime]:
+    """End of the newest archived range, or None when nothing is archived."""
+    return db.query(func.max(models.MessageArchiveSegment.range_end)).scalar()
+
+
+def conversation_segments(db: Session, user1_id: int, user2_id: int):
+    """Query of the segments holding a conversation, with its location in each."""
+    Segment = models.MessageArchiveSegment
+    Entry = models.MessageArchiveConversation
+    return db.query(
+        Segment.path, Segment.range_start, Segment.range_end,
+        Entry.byte_offset, Entry.byte_length, Entry.row_count
+    ).join(Entry, Entry.segment_id == Segment.id).filter(
+        Entry.low_user_id == min(user1_id, user2_id),
+        Entry.high_user_id == max(user1_id, user2_id)
+    )
+
+
+def archived_count(db: Session, user1_id: int, user2_id: int) -> int:
+    """Archived messages of a conversation, from the database index alone."""
+    Entry = models.MessageArchiveConversation
+    return db.query(func.coalesce(func.sum(Entry.row_count), 0)).filter(
+        Entry.low_user_id == min(user1_id, user2_id),
+        Entry.high_user_id == max(user1_id, user2_id)
+    ).scalar()
+
+
+def archived_slice(db: Session, user1_id: int, user2_id: int, skip: int, limit: int) -> List[models.Message]:
+    """Archived messages of a conversation, oldest first, from offset skip.
+
+    Whole segments before the offset are skipped without being read.
+    """
+    Segment = models.MessageArchiveSegment
+    found: List[models.Message] = []
+    for entry in conversation_segments(db, user1_id, user2_id).order_by(Segment.range_start.asc()):
+        if skip >= entry.row_count:
+            skip -= entry.row_count
+            continue
+        found.extend(read_member(entry.path, entry.byte_offset, entry.byte_length)[skip:])
+        skip = 0
+        if len(found) >= limit:
+            break
+    return found[:limit]
+
+
+def archived_page(
+    db: Session,
+    user1_id: int,
+    user2_id: int,
+    limit: int,
+    before: Optional[SortKey] = None,
+    after: Optional[SortKey] = None
+) -> List[models.Message]:
+    """Up to limit archived messages of a conversation next to a cursor.
+
+    With ``after`` they are the oldest ones newer than it, ascending;
+    otherwise the newest ones older than ``before`` (or overall), descending.
+    Only segments holding the conversation are read, one at a time and
+    nearest to the cursor first, until enough rows are found.
+    """
+    Segment = models.MessageArchiveSegment
+    query = conversation_segments(db, user1_id, user2_id)
+    if after is not None:
+        query = query.filter(Segment.range_end > after[0]).order_by(Segment.range_start.asc())
+    else:
+        if before is not None:
+            query = query.filter(Segment.range_start <= before[0])
+        query = query.order_by(Segment.range_start.desc())
+    
+    found: List[models.Message] = []
+    for entry in query.all():
+        messages = read_member(entry.path, entry.byte_offset, entry.byte_length)
+        if after is not None:
+            found.extend(m for m in messages if (m.created_at, m.id) > after)
+        else:
+            messages.reverse()
+            found.extend(m for m in messages if before is None or (m.created_at, m.id) < before)
+        if len(found) >= limit:
+            break
+    return found[:limit]
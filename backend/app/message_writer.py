@@ -0,0 +1,108 @@
+import asyncio
+from typing import List, Optional, Tuple
+
+from app import crud
+from app.core import config, metrics
+from app.core.database import AsyncSessionLocal
+
+PendingMessage = Tuple[dict, asyncio.Future]
+
+
+class MessageBatchWriter:
+    """Write-behind persistence for chat messages.
+
+    Messages submitted from any socket are grouped into one multi-row INSERT
+    per batch, flushed when ``max_batch_size`` messages are waiting or
+    ``max_latency`` seconds after the first one arrived. submit() resolves
+    only after the batch has committed, so callers acknowledge nothing that
+    is not durable; stop() drains everything already queued.
+    """
+
+    def __init__(self, session_factory, max_batch_size: int, max_latency: float):
+        self.session_factory = session_factory
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.queue: Optional["asyncio.Queue[Optional[PendingMessage]]"] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._closing
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._closing = True
+        await self.queue.put(None)
+        await self._task
+        self._task = None
+
+    def queued(self) -> int:
+        return self.queue.qsize() if self.queue is not None else 0
+
+    async def submit(self, sender_id: int, receiver_id: int, content: str):
+        if not self.running:
+            raise RuntimeError("Message writer is not running")
+        future = asyncio.get_running_loop().create_future()
+        row = {"sender_id": sender_id, "receiver_id": receiver_id, "content": content}
+        await self.queue.put((row, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[PendingMessage]):
+        metrics.MESSAGE_WRITER_BATCH_SIZE.observe(len(batch))
+        try:
+            async with self.session_factory() as db:
+                messages = await db.run_sync(crud.create_messages, [row for row, _ in batch])
+        except Exception as e:
+            if len(batch) > 1:
+                # Don't let one bad row fail everyone else's message
+                for pending in batch:
+                    await self._flush([pending])
+                return
+            _, future = batch[0]
+            if not future.done():
+                future.set_exception(e)
+            return
+        for (_, future), message in zip(batch, messages):
+            if not future.done():
+                future.set_result(message)
+
+
+message_writer = MessageBatchWriter(
+    AsyncSessionLocal,
+    max_batch_size=config.MESSAGE_BATCH_MAX_SIZE,
+    max_latency=config.MESSAGE_BATCH_MAX_LATENCY_MS / 1000,
+)
+metrics.MESSAGE_WRITER_QUEUE_DEPTH.set_function(message_writer.queued)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum, DateTime, Text, Boolean
+from sqlalchemy import BigInteger, Column, Integer, String, ForeignKey, Enum, DateTime, Text, Boolean, Index, DDL, event, text
 from sqlalchemy.orm import relationship
 import enum
 import datetime
@@ -15,6 +15,9 @@ class NotificationType(str, enum.Enum):
     connection_rejected = "connection_rejected"
     new_message = "new_message"
 
+# At most one notification per (user_id, related_user_id) may match this
+UNREAD_NEW_MESSAGE = "is_read = false AND type = 'new_message'"
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
@@ -36,6 +39,11 @@ class ConnectionRequest(Base):
     status = Column(Enum(RequestStatus), default=RequestStatus.pending)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_connection_requests_sender_receiver_status", "sender_id", "receiver_id", "status"),
+        Index("ix_connection_requests_receiver_status", "receiver_id", "status"),
+    )
+
 class Message(Base):
     __tablename__ = "messages"
     id = Column(Integer, primary_key=True, index=True)
@@ -47,6 +55,38 @@ class Message(Base):
     sender = relationship("User", foreign_keys=[sender_id], back_populates="sent_messages")
     receiver = relationship("User", foreign_keys=[receiver_id], back_populates="received_messages")
 
+    __table_args__ = (
+        Index("ix_messages_sender_receiver_created_at", "sender_id", "receiver_id", "created_at"),
+        # Reconnect sync: everything to or from a user after a message id
+        Index("ix_messages_receiver_id_id", "receiver_id", "id"),
+        Index("ix_messages_sender_id_id", "sender_id", "id"),
+    )
+
+# Full-text index over message content, outside the ORM model: a generated
+# tsvector column with a GIN index on PostgreSQL, an external-content FTS5
+# table on SQLite (filled by crud.record_messages). The FTS5 table hangs off
+# the metadata rather than the table so create_all() also adds it to
+# development databases made before it existed, indexing the messages they
+# already hold. Migrated databases get both from the add_message_search
+# revision.
+event.listen(Message.__table__, "after_create", DDL(
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS content_tsv tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED"
+).execute_if(dialect="postgresql"))
+event.listen(Message.__table__, "after_create", DDL(
+    "CREATE INDEX IF NOT EXISTS ix_messages_content_tsv ON messages USING gin (content_tsv)"
+).execute_if(dialect="postgresql"))
+@event.listens_for(Base.metadata, "after_create")
+def create_message_fts(target, connection, **kw):
+    if connection.dialect.name != "sqlite":
+        return
+    if connection.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'").first():
+        return
+    connection.exec_driver_sql(
+        "CREATE VIRTUAL TABLE messages_fts USING fts5(content, content='messages', content_rowid='id')"
+    )
+    connection.exec_driver_sql("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+
 class Notification(Base):
     __tablename__ = "notifications"
     id = Column(Integer, primary_key=True, index=True)
@@ -56,12 +96,109 @@ class Notification(Base):
     message = Column(Text, nullable=False)
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # Unread new_message notifications from one sender are folded into one row
+    message_count = Column(Integer, nullable=False, default=1, server_default="1")
     
     related_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     related_request_id = Column(Integer, ForeignKey("connection_requests.id"), nullable=True)
-    related_message_id = Column(Integer, ForeignKey("messages.id"), nullable=True)
+    # No foreign key: on PostgreSQL messages is partitioned by created_at, and
+    # a partitioned table's unique keys must include the partition column
+    related_message_id = Column(Integer, nullable=True)
     
     user = relationship("User", foreign_keys=[user_id], back_populates="notifications")
     related_user = relationship("User", foreign_keys=[related_user_id])
     related_request = relationship("ConnectionRequest", foreign_keys=[related_request_id])
-    related_message = relationship("Message", foreign_keys=[related_message_id])
+    related_message = relationship(
+        "Message", primaryjoin="Notification.related_message_id == Message.id", foreign_keys=[related_message_id]
+    )
+
+    __table_args__ = (
+        Index("ix_notifications_user_read_created_at", "user_id", "is_read", "created_at"),
+        Index("ix_notifications_type_read_created_at", "type", "is_read", "created_at"),
+        Index(
+            "ux_notifications_unread_new_message", "user_id", "related_user_id", unique=True,
+            postgresql_where=text(UNREAD_NEW_MESSAGE),
+            sqlite_where=text(UNREAD_NEW_MESSAGE)
+        ),
+    )
+
+class NotificationArchive(Base):
+    """Notifications removed by the retention job when it runs in archive mode."""
+    __tablename__ = "notification_archive"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    type = Column(Enum(NotificationType), nullable=False)
+    title = Column(String, nullable=False)
+    message = Column(Text, nullable=False)
+    is_read = Column(Boolean, default=False)
+    created_at = Column(DateTime)
+    message_count = Column(Integer, nullable=False, default=1)
+    related_user_id = Column(Integer, nullable=True)
+    related_request_id = Column(Integer, nullable=True)
+    related_message_id = Column(Integer, nullable=True)
+    archived_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_notification_archive_user_created_at", "user_id", "created_at"),
+    )
+
+class ConversationCounter(Base):
+    """Message total per conversation, keyed by the ordered user id pair."""
+    __tablename__ = "conversation_counters"
+    user_low_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    user_high_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    message_count = Column(Integer, nullable=False, default=0)
+
+class NotificationCounter(Base):
+    """Per-user notification totals kept in step with the notifications table."""
+    __tablename__ = "notification_counters"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_count = Column(Integer, nullable=False, default=0)
+    unread_count = Column(Integer, nullable=False, default=0)
+
+class UserVersion(Base):
+    """Per-user version stamps bumped by every write to the data behind a polled endpoint."""
+    __tablename__ = "user_versions"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    notifications_version = Column(Integer, nullable=False, default=0)
+    connections_version = Column(Integer, nullable=False, default=0)
+
+class ConversationSummary(Base):
+    """One row per user per conversation, updated with every new message."""
+    __tablename__ = "conversation_summaries"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    peer_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    last_message_id = Column(Integer, nullable=False)
+    last_sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    last_message_preview = Column(String, nullable=False)
+    last_message_at = Column(DateTime, nullable=False)
+    unread_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_conversation_summaries_user_last_message_at", "user_id", "last_message_at"),
+    )
+
+class MessageArchiveSegment(Base):
+    """Manifest of a month of messages exported to a compressed archive segment."""
+    __tablename__ = "message_archive_segments"
+    id = Column(Integer, primary_key=True)
+    path = Column(String, nullable=False, unique=True)
+    range_start = Column(DateTime, nullable=False, index=True)
+    range_end = Column(DateTime, nullable=False)
+    row_count = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class MessageArchiveConversation(Base):
+    """Where one conversation's rows sit inside an archive segment.
+
+    Keyed by the ordered user pair so history reads find the segments that
+    hold a conversation without opening any segment's index file.
+    """
+    __tablename__ = "message_archive_conversations"
+    low_user_id = Column(Integer, primary_key=True)
+    high_user_id = Column(Integer, primary_key=True)
+    segment_id = Column(Integer, ForeignKey("message_archive_segments.id", ondelete="CASCADE"), primary_key=True)
+    byte_offset = Column(BigInteger, nullable=False)
+    byte_length = Column(Integer, nullable=False)
+    row_count = Column(Integer, nullable=False)
+
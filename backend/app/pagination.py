@@ -0,0 +1,45 @@
+import base64
+import datetime
+import json
+from typing import Tuple
+
+Cursor = Tuple[datetime.datetime, int]
+ScoreCursor = Tuple[float, int]
+
+
+def _encode(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> list:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    return json.loads(raw)
+
+
+def encode_cursor(created_at: datetime.datetime, row_id: int) -> str:
+    """Opaque keyset cursor for a row ordered by (created_at, id)."""
+    return _encode([created_at.isoformat(), row_id])
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Inverse of encode_cursor; raises ValueError for anything malformed."""
+    try:
+        created_at, row_id = _decode(cursor)
+        return datetime.datetime.fromisoformat(created_at), int(row_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def encode_score_cursor(score: float, row_id: int) -> str:
+    """Opaque keyset cursor for a row ordered by (score, id), e.g. search rank."""
+    return _encode([score, row_id])
+
+
+def decode_score_cursor(cursor: str) -> ScoreCursor:
+    """Inverse of encode_score_cursor; raises ValueError for anything malformed."""
+    try:
+        score, row_id = _decode(cursor)
+        return float(score), int(row_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
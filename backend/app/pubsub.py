@@ -0,0 +1,250 @@
+import asyncio
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from app.core import config, metrics
+
+logger = logging.getLogger(__name__)
+
+MessageHandler = Callable[[int, str], Awaitable[None]]
+BroadcastHandler = Callable[[str], Awaitable[None]]
+
+
+class PubSubBackend(ABC):
+    """Routes a user's messages to the process that holds their WebSocket.
+
+    Every ConnectionManager subscribes to the users it has sockets for and
+    publishes everything it sends, so a recipient attached to another worker
+    still gets the message. broadcast() reaches every other worker's
+    on_broadcast handler, for state they all keep, such as caches.
+    """
+
+    @abstractmethod
+    async def start(self, handler: MessageHandler, on_broadcast: Optional[BroadcastHandler] = None):
+        pass
+
+    @abstractmethod
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def subscribe(self, user_id: int):
+        pass
+
+    @abstractmethod
+    async def unsubscribe(self, user_id: int):
+        pass
+
+    @abstractmethod
+    async def publish(self, user_id: int, message: str) -> int:
+        """Send to other subscribers of user_id; returns how many received it."""
+
+    @abstractmethod
+    async def broadcast(self, message: str):
+        """Send to every other worker's on_broadcast handler."""
+
+    @abstractmethod
+    async def is_online(self, user_id: int) -> bool:
+        pass
+
+
+class InMemoryPubSub(PubSubBackend):
+    """Single-process backend.
+
+    Backends that share a hub dict see each other's publishes, which is what
+    several managers inside one process need; a standalone instance has no
+    peers and publishing is a no-op.
+    """
+
+    # Hub key of the backends listening for broadcasts
+    BROADCAST = None
+
+    def __init__(self, hub: Optional[Dict[Optional[int], Set["InMemoryPubSub"]]] = None):
+        self.hub = hub if hub is not None else {}
+        self.handler: Optional[MessageHandler] = None
+        self.on_broadcast: Optional[BroadcastHandler] = None
+
+    async def start(self, handler: MessageHandler, on_broadcast: Optional[BroadcastHandler] = None):
+        self.handler = handler
+        self.on_broadcast = on_broadcast
+        self.hub.setdefault(self.BROADCAST, set()).add(self)
+
+    async def stop(self):
+        for subscribers in self.hub.values():
+            subscribers.discard(self)
+
+    async def subscribe(self, user_id: int):
+        self.hub.setdefault(user_id, set()).add(self)
+
+    async def unsubscribe(self, user_id: int):
+        subscribers = self.hub.get(user_id)
+        if subscribers:
+            subscribers.discard(self)
+            if not subscribers:
+                del self.hub[user_id]
+
+    async def publish(self, user_id: int, message: str) -> int:
+        peers = [b for b in self.hub.get(user_id, ()) if b is not self and b.handler]
+        for peer in peers:
+            await peer.handler(user_id, message)
+        return len(peers)
+
+    async def broadcast(self, message: str):
+        for peer in [b for b in self.hub.get(self.BROADCAST, ()) if b is not self and b.on_broadcast]:
+            await peer.on_broadcast(message)
+
+    async def is_online(self, user_id: int) -> bool:
+        return any(b is not self for b in self.hub.get(user_id, ()))
+
+
+class RedisPubSub(PubSubBackend):
+    """Redis backend: one channel per user, subscribed by the owning worker(s).
+
+    If the subscriber connection drops, the listener reconnects with
+    exponential backoff and resubscribes every channel currently held.
+    Messages published while it is down are lost, as with any Redis pub/sub.
+    """
+
+    CHANNEL_PREFIX = "ws:user:"
+    BROADCAST_CHANNEL = "ws:broadcast"
+    RECONNECT_MIN_DELAY = 0.5
+    RECONNECT_MAX_DELAY = 30.0
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url, decode_responses=True)
+        self.errors = redis.RedisError
+        self.pubsub = self.redis.pubsub()
+        self.node_id = uuid.uuid4().hex
+        self.channels: Set[str] = set()
+        self.handler: Optional[MessageHandler] = None
+        self.on_broadcast: Optional[BroadcastHandler] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    def _channel(self, user_id: int) -> str:
+        return f"{self.CHANNEL_PREFIX}{user_id}"
+
+    async def start(self, handler: MessageHandler, on_broadcast: Optional[BroadcastHandler] = None):
+        self.handler = handler
+        self.on_broadcast = on_broadcast
+        await self._subscribe_all()
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        await self.pubsub.aclose()
+        await self.redis.aclose()
+
+    async def _subscribe_all(self):
+        # The node channel keeps the connection subscribed even while no
+        # users are attached, otherwise listen() returns immediately.
+        await self.pubsub.subscribe(f"ws:node:{self.node_id}", self.BROADCAST_CHANNEL, *self.channels)
+
+    async def _reconnect(self):
+        try:
+            await self.pubsub.aclose()
+        except self.errors:
+            pass
+        self.pubsub = self.redis.pubsub()
+        await self._subscribe_all()
+
+    async def _listen(self):
+        delay = self.RECONNECT_MIN_DELAY
+        while True:
+            try:
+                async for item in self.pubsub.listen():
+                    delay = self.RECONNECT_MIN_DELAY
+                    await self._dispatch(item)
+            except self.errors:
+                metrics.PUBSUB_RECONNECTS.inc()
+                logger.warning("pubsub_connection_lost", extra={"retry_in": delay}, exc_info=True)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+            try:
+                await self._reconnect()
+            except self.errors:
+                logger.warning("pubsub_reconnect_failed", extra={"retry_in": delay}, exc_info=True)
+                continue
+            logger.info("pubsub_resubscribed", extra={"channels": len(self.channels)})
+
+    async def _dispatch(self, item: dict):
+        if item["type"] != "message":
+            return
+        if item["channel"] == self.BROADCAST_CHANNEL:
+            await self._deliver_broadcast(item["data"])
+            return
+        if not item["channel"].startswith(self.CHANNEL_PREFIX):
+            return
+        envelope = json.loads(item["data"])
+        if envelope["origin"] == self.node_id:
+            return
+        user_id = int(item["channel"][len(self.CHANNEL_PREFIX):])
+        try:
+            await self.handler(user_id, envelope["payload"])
+        except Exception:
+            logger.exception("pubsub_delivery_failed", extra={"user_id": user_id})
+
+    async def _deliver_broadcast(self, data: str):
+        envelope = json.loads(data)
+        if envelope["origin"] == self.node_id or self.on_broadcast is None:
+            return
+        try:
+            await self.on_broadcast(envelope["payload"])
+        except Exception:
+            logger.exception("pubsub_broadcast_delivery_failed")
+
+    async def subscribe(self, user_id: int):
+        channel = self._channel(user_id)
+        if channel not in self.channels:
+            self.channels.add(channel)
+            # While disconnected the listener resubscribes self.channels
+            try:
+                await self.pubsub.subscribe(channel)
+            except self.errors:
+                logger.warning("pubsub_subscribe_failed", extra={"user_id": user_id}, exc_info=True)
+
+    async def unsubscribe(self, user_id: int):
+        channel = self._channel(user_id)
+        if channel in self.channels:
+            self.channels.discard(channel)
+            try:
+                await self.pubsub.unsubscribe(channel)
+            except self.errors:
+                logger.warning("pubsub_unsubscribe_failed", extra={"user_id": user_id}, exc_info=True)
+
+    async def publish(self, user_id: int, message: str) -> int:
+        channel = self._channel(user_id)
+        envelope = json.dumps({"origin": self.node_id, "payload": message})
+        receivers = await self.redis.publish(channel, envelope)
+        # Our own subscription is counted by Redis but skipped by _listen
+        if channel in self.channels:
+            receivers -= 1
+        return receivers
+
+    async def broadcast(self, message: str):
+        envelope = json.dumps({"origin": self.node_id, "payload": message})
+        await self.redis.publish(self.BROADCAST_CHANNEL, envelope)
+
+    async def is_online(self, user_id: int) -> bool:
+        channel = self._channel(user_id)
+        [(_, subscribers)] = await self.redis.pubsub_numsub(channel)
+        if channel in self.channels:
+            subscribers -= 1
+        return subscribers > 0
+
+
+def create_backend() -> PubSubBackend:
+    if config.PUBSUB_BACKEND == "redis":
+        return RedisPubSub(config.REDIS_URL)
+    if config.PUBSUB_BACKEND != "memory":
+        raise ValueError(f"Unknown PUBSUB_BACKEND: {config.PUBSUB_BACKEND}")
+    return InMemoryPubSub()
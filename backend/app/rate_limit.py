@@ -0,0 +1,178 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from starlette.requests import HTTPConnection
+
+from app.core import config, metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Bucket(NamedTuple):
+    """A token bucket: refills at rate tokens per second, holds at most burst."""
+    name: str
+    rate: float
+    burst: int
+
+
+CHAT_SEND = Bucket("chat_send", config.RATE_LIMIT_CHAT_PER_SECOND, config.RATE_LIMIT_CHAT_BURST)
+CONNECTION_REQUESTS = Bucket(
+    "connection_requests", config.RATE_LIMIT_REQUESTS_PER_SECOND, config.RATE_LIMIT_REQUESTS_BURST
+)
+WS_HANDSHAKE = Bucket(
+    "ws_handshake", config.RATE_LIMIT_WS_HANDSHAKE_PER_SECOND, config.RATE_LIMIT_WS_HANDSHAKE_BURST
+)
+
+
+class RateLimiter:
+    """Token buckets keyed by bucket name and caller.
+
+    acquire() takes cost tokens and returns 0, or leaves the bucket alone
+    and returns how many seconds until cost tokens will be available.
+    Costs above the burst are capped to it, so a large batch is allowed
+    once the bucket is full rather than never.
+    """
+
+    async def acquire(self, key: str, bucket: Bucket, cost: int = 1) -> float:
+        return 0.0
+
+
+class LocalRateLimiter(RateLimiter):
+    """Per-worker buckets in an LRU of max_keys; only used from the event loop."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def acquire(self, key: str, bucket: Bucket, cost: int = 1) -> float:
+        return self.take(key, bucket, cost, time.monotonic())
+
+    def take(self, key: str, bucket: Bucket, cost: int, now: float) -> float:
+        cost = min(cost, bucket.burst)
+        tokens, updated = self._buckets.get(key, (bucket.burst, now))
+        tokens = min(bucket.burst, tokens + max(0.0, now - updated) * bucket.rate)
+        retry_after = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            retry_after = (cost - tokens) / bucket.rate
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        # An evicted bucket comes back full, which only matters for callers
+        # idle long enough to fall off the end
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+class RedisRateLimiter(RateLimiter):
+    """Buckets shared by every worker, updated atomically by a Lua script.
+
+    Redis errors are logged and the call is let through: a Redis outage
+    should not take chat down with it.
+    """
+
+    PREFIX = "ratelimit:"
+    SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 't', 'u')
+local rate, burst, now, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local tokens, updated = tonumber(state[1]), tonumber(state[2])
+if tokens == nil then
+    tokens, updated = burst, now
+end
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 't', tokens, 'u', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(retry_after)
+"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url, decode_responses=True, socket_timeout=0.5)
+        self.errors = redis.RedisError
+        self.script = self.redis.register_script(self.SCRIPT)
+
+    async def acquire(self, key: str, bucket: Bucket, cost: int = 1) -> float:
+        try:
+            retry_after = await self.script(
+                keys=[self.PREFIX + key],
+                args=[bucket.rate, bucket.burst, time.time(), min(cost, bucket.burst)]
+            )
+        except self.errors:
+            logger.warning("rate_limiter_unavailable", exc_info=True)
+            return 0.0
+        return float(retry_after)
+
+
+def create_rate_limiter() -> RateLimiter:
+    if config.RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimiter(config.REDIS_URL)
+    if config.RATE_LIMIT_BACKEND == "memory":
+        return LocalRateLimiter(config.RATE_LIMIT_MAX_KEYS)
+    if config.RATE_LIMIT_BACKEND != "none":
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {config.RATE_LIMIT_BACKEND}")
+    return RateLimiter()
+
+
+rate_limiter = create_rate_limiter()
+
+
+def client_ip(connection: HTTPConnection) -> str:
+    return connection.client.host if connection.client else "unknown"
+
+
+async def check(bucket: Bucket, key: str, cost: int = 1) -> float:
+    """Take from bucket for key; returns 0 if allowed, else seconds to wait."""
+    if bucket.rate <= 0:
+        return 0.0
+    retry_after = await rate_limiter.acquire(f"{bucket.name}:{key}", bucket, cost)
+    if retry_after:
+        metrics.RATE_LIMITED.labels(bucket.name).inc()
+        logger.info("rate_limited", extra={"sampled": True, "bucket": bucket.name, "key": key})
+    return retry_after
+
+
+async def enforce(bucket: Bucket, key: str, cost: int = 1):
+    """check(), raising a 429 with Retry-After when the bucket is empty."""
+    retry_after = await check(bucket, key, cost)
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests, slow down",
+            headers={"Retry-After": str(max(1, round(retry_after + 0.5)))}
+        )
+
+
+async def batch_cost(request: Request, field: Optional[str]) -> int:
+    """Items in the JSON body's field, so a batch costs as much as its singles."""
+    if field is None:
+        return 1
+    try:
+        items = (await request.json()).get(field)
+    except (ValueError, AttributeError):
+        return 1
+    return len(items) if isinstance(items, list) and items else 1
+
+
+def limit_sender(bucket: Bucket, batch_field: Optional[str] = None):
+    """Route dependency limiting each sender_id query parameter."""
+    async def dependency(request: Request, sender_id: int):
+        await enforce(bucket, f"user:{sender_id}", await batch_cost(request, batch_field))
+    return dependency
+
+
+def limit_client(bucket: Bucket, batch_field: Optional[str] = None):
+    """Route dependency limiting each client IP, for routes without a sender."""
+    async def dependency(request: Request):
+        await enforce(bucket, f"ip:{client_ip(request)}", await batch_cost(request, batch_field))
+    return dependency
@@ -0,0 +1,153 @@
+"""Notification retention.
+
+Read notifications older than their type's TTL (and, if configured, unread
+ones older than NOTIFICATION_UNREAD_TTL_DAYS) are deleted or copied to
+notification_archive first. Work is done in batches of ids, each in its own
+short transaction, so no statement holds row locks for long; on PostgreSQL
+the batch is claimed with FOR UPDATE SKIP LOCKED so concurrent runs from
+several workers do not collide.
+"""
+import asyncio
+import datetime
+import logging
+from typing import Dict, Optional
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from app import crud, models, schemas
+from app.core import config
+from app.core.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+RETENTION_MODES = ("delete", "archive")
+
+
+def parse_ttls(spec: str, default_days: float) -> Dict[schemas.NotificationType, float]:
+    ttls = {notification_type: default_days for notification_type in schemas.NotificationType}
+    for item in spec.split(","):
+        if "=" in item:
+            name, days = item.split("=", 1)
+            ttls[schemas.NotificationType(name.strip())] = float(days)
+    return ttls
+
+
+def purge_batch(
+    db: Session,
+    notification_type: schemas.NotificationType,
+    cutoff: datetime.datetime,
+    read_only: bool,
+    batch_size: int,
+    archive: bool
+) -> int:
+    """Remove up to batch_size expired notifications of one type; returns how many."""
+    Notification = models.Notification
+    query = select(Notification.id).where(
+        Notification.type == notification_type,
+        Notification.created_at < cutoff
+    )
+    if read_only:
+        query = query.where(Notification.is_read == True)
+    ids = db.scalars(query.order_by(Notification.id).limit(batch_size).with_for_update(skip_locked=True)).all()
+    if not ids:
+        db.rollback()
+        return 0
+    
+    if archive:
+        columns = [column.name for column in Notification.__table__.columns]
+        db.execute(
+            insert(models.NotificationArchive).from_select(
+                columns, select(*Notification.__table__.columns).where(Notification.id.in_(ids))
+            )
+        )
+    removed = db.execute(
+        delete(Notification)
+        .where(Notification.id.in_(ids))
+        .returning(Notification.user_id, Notification.is_read)
+        .execution_options(synchronize_session=False)
+    ).all()
+    
+    per_user: Dict[int, list] = {}
+    for user_id, is_read in removed:
+        counts = per_user.setdefault(user_id, [0, 0])
+        counts[0] += 1
+        counts[1] += 0 if is_read else 1
+    for user_id, (total, unread) in sorted(per_user.items()):
+        crud.increment_counter(
+            db, models.NotificationCounter, {"user_id": user_id},
+            total_count=-total, unread_count=-unread
+        )
+    crud.bump_versions(db, crud.NOTIFICATIONS_VERSION, per_user)
+    db.commit()
+    return len(removed)
+
+
+def purge_notifications(
+    db: Session,
+    now: Optional[datetime.datetime] = None,
+    ttls: Optional[Dict[schemas.NotificationType, float]] = None,
+    unread_ttl_days: float = config.NOTIFICATION_UNREAD_TTL_DAYS,
+    batch_size: int = config.NOTIFICATION_RETENTION_BATCH_SIZE,
+    mode: str = config.NOTIFICATION_RETENTION_MODE
+) -> Dict[str, int]:
+    """Apply the retention policy; returns the number of rows removed per type."""
+    if mode not in RETENTION_MODES:
+        raise ValueError(f"Unknown retention mode {mode!r}, expected one of {RETENTION_MODES}")
+    now = now or datetime.datetime.utcnow()
+    ttls = ttls or parse_ttls(config.NOTIFICATION_TTLS, config.NOTIFICATION_TTL_DAYS)
+    
+    passes = [(t, now - datetime.timedelta(days=days), True) for t, days in ttls.items() if days > 0]
+    if unread_ttl_days > 0:
+        cutoff = now - datetime.timedelta(days=unread_ttl_days)
+        passes += [(t, cutoff, False) for t in schemas.NotificationType]
+    
+    removed = {t.value: 0 for t in schemas.NotificationType}
+    for notification_type, cutoff, read_only in passes:
+        while True:
+            count = purge_batch(db, notification_type, cutoff, read_only, batch_size, mode == "archive")
+            removed[notification_type.value] += count
+            if count < batch_size:
+                break
+    return removed
+
+
+class RetentionJob:
+    """Runs purge_notifications every ``interval`` seconds off the event loop."""
+
+    def __init__(self, session_factory, interval: float):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def run_once(self) -> Dict[str, int]:
+        db = self.session_factory()
+        try:
+            return purge_notifications(db)
+        finally:
+            db.close()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                removed = await asyncio.to_thread(self.run_once)
+                logger.info("notification_retention_run", extra={"removed": removed})
+            except Exception:
+                logger.exception("notification_retention_failed")
+
+
+retention_job = RetentionJob(SessionLocal, interval=config.NOTIFICATION_RETENTION_INTERVAL_SECONDS)
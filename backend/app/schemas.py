@@ -1,8 +1,10 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 import datetime
 from enum import Enum
 from typing import List, Optional
 
+MAX_BATCH_SIZE = 500
+
 class RequestStatus(str, Enum):
     pending = "pending"
     accepted = "accepted"
@@ -35,6 +37,37 @@ class ConnectionRequestOut(BaseModel):
     status: RequestStatus
     created_at: datetime.datetime
 
+class ConnectionRequestWithUsers(ConnectionRequestOut):
+    sender_username: Optional[str] = None
+    receiver_username: Optional[str] = None
+
+class BatchItemStatus(str, Enum):
+    created = "created"
+    updated = "updated"
+    exists = "exists"
+    unchanged = "unchanged"
+    not_found = "not_found"
+    invalid = "invalid"
+
+class ConnectionRequestBatchCreate(BaseModel):
+    receiver_ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class ConnectionRequestBatchUpdate(BaseModel):
+    request_ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class ConnectionRequestBatchItem(BaseModel):
+    # The receiver id for send-batch, the request id for accept/reject-batch
+    id: int
+    status: BatchItemStatus
+    request: Optional[ConnectionRequestOut] = None
+
+class ConnectionRequestBatchResponse(BaseModel):
+    results: List[ConnectionRequestBatchItem]
+
+class UserBatchResponse(BaseModel):
+    users: List[UserOut]
+    missing_ids: List[int]
+
 class MessageCreate(BaseModel):
     receiver_id: int
     content: str
@@ -65,11 +98,43 @@ class ChatHistoryResponse(BaseModel):
     page: int
     limit: int
 
+class ChatHistoryCursorResponse(BaseModel):
+    messages: List[MessageOut]
+    next_cursor: Optional[str] = None
+    limit: int
+
+class MessageSearchHit(MessageOut):
+    score: float
+
+class MessageSearchResponse(BaseModel):
+    hits: List[MessageSearchHit]
+    next_cursor: Optional[str] = None
+    limit: int
+
+class InboxEntry(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    peer_id: int
+    peer_username: str
+    last_message_id: int
+    last_sender_id: int
+    last_message_preview: str
+    last_message_at: datetime.datetime
+    unread_count: int
+
+class InboxResponse(BaseModel):
+    conversations: List[InboxEntry]
+    next_cursor: Optional[str] = None
+    limit: int
+
 class WSMessageType(str, Enum):
     message = "message"
     user_connected = "user_connected"
     user_disconnected = "user_disconnected"
     error = "error"
+    sync = "sync"
+    sync_complete = "sync_complete"
+    throttled = "throttled"
 
 class WSMessage(BaseModel):
     type: WSMessageType
@@ -88,6 +153,7 @@ class NotificationOut(BaseModel):
     message: str
     is_read: bool
     created_at: datetime.datetime
+    message_count: int = 1
     related_user_id: Optional[int] = None
     related_request_id: Optional[int] = None
     related_message_id: Optional[int] = None
@@ -102,6 +168,7 @@ class NotificationWithDetails(BaseModel):
     message: str
     is_read: bool
     created_at: datetime.datetime
+    message_count: int = 1
     related_user_id: Optional[int] = None
     related_user_username: Optional[str] = None
     related_request_id: Optional[int] = None
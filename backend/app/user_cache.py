@@ -0,0 +1,251 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+from app import schemas
+from app.core import config, metrics
+
+logger = logging.getLogger(__name__)
+
+
+class UserCache:
+    """Read-through cache of user snapshots and GET /users/ pages.
+
+    Values are schemas.UserOut, never ORM objects, so they can be shared
+    between sessions and workers. Users are immutable once created; the
+    only invalidation needed is create_user bumping the directory
+    generation, which retires every cached page at once. Misses are not
+    cached, so looking up a user created on another worker by id works
+    immediately; whether the directory pages show it depends on the
+    backend sharing the generation.
+    """
+
+    backend = "none"
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key: str) -> Any:
+        return None
+
+    def _set(self, key: str, value: Any):
+        pass
+
+    def _delete(self, key: str):
+        pass
+
+    def _generation(self) -> Optional[int]:
+        return 0
+
+    def _bump_generation(self):
+        pass
+
+    def clear(self):
+        pass
+
+    def _lookup(self, key: str, kind: str) -> Any:
+        value = self._get(key)
+        result = "miss" if value is None else "hit"
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        metrics.USER_CACHE_REQUESTS.labels(kind, result).inc()
+        return value
+
+    def get_user(self, user_id: int) -> Optional[schemas.UserOut]:
+        return self._lookup(f"user:{user_id}", "user")
+
+    def put_user(self, user) -> schemas.UserOut:
+        snapshot = schemas.UserOut.model_validate(user)
+        self._set(f"user:{snapshot.id}", snapshot)
+        return snapshot
+
+    def page_key(self, skip: int, limit: int) -> Optional[str]:
+        """Call before querying the database for a page that will be put_page()d.
+
+        None means the generation is unknown; such pages are neither read nor stored.
+        """
+        generation = self._generation()
+        if generation is None:
+            return None
+        return f"users:{generation}:{skip}:{limit}"
+
+    def get_page(self, key: Optional[str]) -> Optional[List[schemas.UserOut]]:
+        if key is None:
+            self.misses += 1
+            metrics.USER_CACHE_REQUESTS.labels("page", "miss").inc()
+            return None
+        return self._lookup(key, "page")
+
+    def put_page(self, key: Optional[str], users) -> List[schemas.UserOut]:
+        snapshots = [schemas.UserOut.model_validate(user) for user in users]
+        if key is not None:
+            self._set(key, snapshots)
+        return snapshots
+
+    def invalidate_user(self, user_id: int):
+        self._delete(f"user:{user_id}")
+        self._bump_generation()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class LocalUserCache(UserCache):
+    """Per-worker LRU bounded by max_entries, with entries expiring after ttl seconds.
+
+    The generation is per worker too, so a user created through another
+    worker doesn't retire this worker's pages. Pages therefore expire after
+    page_ttl, which bounds how long they can miss a new user.
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_entries: int, ttl: Optional[float] = None, page_ttl: Optional[float] = None):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.page_ttl = page_ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._gen = 0
+
+    def _get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            ttl = self.page_ttl if key.startswith("users:") else self.ttl
+            if ttl is not None and time.monotonic() - stored_at > ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _generation(self) -> int:
+        return self._gen
+
+    def _bump_generation(self):
+        with self._lock:
+            self._gen += 1
+
+    def clear(self):
+        with self._lock:
+            self._gen += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {**super().stats(), "size": len(self._entries), "max_entries": self.max_entries}
+
+
+class RedisUserCache(UserCache):
+    """Shared cache so every worker sees the same entries and invalidations.
+
+    Entries are JSON with a Redis TTL; size is bounded by the TTL and the
+    server's maxmemory policy. Redis errors are logged and treated as
+    misses so the database stays the fallback.
+    """
+
+    backend = "redis"
+    PREFIX = "usercache:"
+
+    def __init__(self, url: str, ttl: Optional[float] = None):
+        super().__init__()
+        import redis
+
+        self.redis = redis.Redis.from_url(url, decode_responses=True, socket_timeout=0.5)
+        self.errors = redis.RedisError
+        self.ttl = int(ttl) if ttl else None
+
+    def _get(self, key: str) -> Any:
+        try:
+            raw = self.redis.get(self.PREFIX + key)
+        except self.errors:
+            logger.warning("user_cache_unavailable", exc_info=True)
+            return None
+        if raw is None:
+            return None
+        value = json.loads(raw)
+        if isinstance(value, list):
+            return [schemas.UserOut(**item) for item in value]
+        return schemas.UserOut(**value)
+
+    def _set(self, key: str, value: Any):
+        if isinstance(value, list):
+            raw = json.dumps([item.model_dump() for item in value])
+        else:
+            raw = value.model_dump_json()
+        try:
+            self.redis.set(self.PREFIX + key, raw, ex=self.ttl)
+        except self.errors:
+            logger.warning("user_cache_unavailable", exc_info=True)
+
+    def _delete(self, key: str):
+        try:
+            self.redis.delete(self.PREFIX + key)
+        except self.errors:
+            logger.warning("user_cache_unavailable", exc_info=True)
+
+    def _generation(self) -> Optional[int]:
+        try:
+            return int(self.redis.get(self.PREFIX + "generation") or 0)
+        except self.errors:
+            logger.warning("user_cache_unavailable", exc_info=True)
+            return None
+
+    def _bump_generation(self):
+        try:
+            self.redis.incr(self.PREFIX + "generation")
+        except self.errors:
+            logger.warning("user_cache_unavailable", exc_info=True)
+
+    def clear(self):
+        try:
+            keys = list(self.redis.scan_iter(match=self.PREFIX + "*"))
+            if keys:
+                self.redis.delete(*keys)
+        except self.errors:
+            logger.warning("user_cache_unavailable", exc_info=True)
+        # Keep the generation moving so pages cached before the clear by a
+        # racing worker can't be read back
+        self._bump_generation()
+
+
+def create_user_cache() -> UserCache:
+    if config.USER_CACHE_BACKEND == "redis":
+        return RedisUserCache(config.REDIS_URL, ttl=config.USER_CACHE_TTL_SECONDS or None)
+    if config.USER_CACHE_BACKEND == "memory":
+        return LocalUserCache(
+            config.USER_CACHE_MAX_ENTRIES,
+            ttl=config.USER_CACHE_TTL_SECONDS or None,
+            page_ttl=config.USER_CACHE_PAGE_TTL_SECONDS or None
+        )
+    if config.USER_CACHE_BACKEND != "none":
+        raise ValueError(f"Unknown USER_CACHE_BACKEND: {config.USER_CACHE_BACKEND}")
+    return UserCache()
+
+
+user_cache = create_user_cache()
@@ -1,35 +1,216 @@
 from fastapi import WebSocket
-from typing import Dict, List
+import anyio
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set
 import json
 import datetime
+import logging
 from app import schemas
+from app.core import config, metrics
+from app.pubsub import PubSubBackend, create_backend
+
+
+logger = logging.getLogger(__name__)
+
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "disconnect")
+# "Try Again Later": the client was closed for falling behind, not for misbehaving
+SLOW_CONSUMER_CLOSE_CODE = 1013
+# The writer failed mid-send; the socket is most likely already gone
+SEND_FAILED_CLOSE_CODE = 1011
+
+# Fire-and-forget tasks are only weakly referenced by the event loop
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def spawn(coro: Awaitable[None]) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+class ClientConnection:
+    """One socket of a user, with a bounded outbound queue drained by its own writer task.
+
+    Senders only enqueue, so a client that reads slowly delays nobody but
+    itself; when its queue is full the slow-consumer policy applies. Either
+    way a connection dies, on_dead is called with it and a close code so
+    the manager can forget it.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: int, max_queue: int, policy: str,
+                 on_dead: Callable[["ClientConnection", int], Awaitable[None]]):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+        self.websocket = websocket
+        self.user_id = user_id
+        self.policy = policy
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.closed = False
+        self._on_dead = on_dead
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def send(self, message: str) -> bool:
+        """Queue a frame without waiting; False if the socket can't take it."""
+        if self.closed:
+            metrics.WS_FRAMES_DROPPED.labels("closed").inc()
+            return False
+        try:
+            self.queue.put_nowait(message)
+            metrics.WS_FRAMES_QUEUED.inc()
+            return True
+        except asyncio.QueueFull:
+            pass
+        if self.policy == "drop_oldest":
+            self.queue.get_nowait()
+            self.queue.put_nowait(message)
+            self.dropped += 1
+            metrics.WS_FRAMES_DROPPED.labels("drop_oldest").inc()
+            metrics.WS_FRAMES_QUEUED.inc()
+            return True
+        metrics.WS_FRAMES_DROPPED.labels("slow_consumer").inc()
+        self.closed = True
+        logger.warning("ws_slow_consumer_disconnected", extra={"user_id": self.user_id})
+        spawn(self._on_dead(self, SLOW_CONSUMER_CLOSE_CODE))
+        return False
+
+    async def send_wait(self, message: str) -> bool:
+        """Queue a frame, waiting for room instead of applying the slow-consumer policy.
+
+        For bulk output such as reconnect sync, where the producer can simply
+        go at the client's pace. False if the socket closes first.
+        """
+        while not self.closed:
+            try:
+                await asyncio.wait_for(self.queue.put(message), timeout=1.0)
+            except asyncio.TimeoutError:
+                continue
+            metrics.WS_FRAMES_QUEUED.inc()
+            return True
+        return False
+
+    async def _write_loop(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                await self.websocket.send_text(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            metrics.WS_SEND_FAILURES.inc()
+            logger.warning("ws_send_failed", extra={"user_id": self.user_id, "error": str(e)})
+            self.closed = True
+            await self._on_dead(self, SEND_FAILED_CLOSE_CODE)
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+        if self._writer and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        if code != 1000:
+            try:
+                await self.websocket.close(code=code)
+            except Exception:
+                pass
 
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, WebSocket] = {}
+    def __init__(
+        self,
+        backend: Optional[PubSubBackend] = None,
+        max_queue: int = config.WS_SEND_QUEUE_SIZE,
+        slow_consumer_policy: str = config.WS_SLOW_CONSUMER_POLICY
+    ):
+        self.active_connections: Dict[int, Set[ClientConnection]] = {}
+        self.backend = backend if backend is not None else create_backend()
+        self.max_queue = max_queue
+        self.slow_consumer_policy = slow_consumer_policy
+        self._broadcast_handlers: Dict[str, Callable[[dict], None]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        await self.backend.start(self._deliver_local, self._deliver_broadcast)
+
+    async def stop(self):
+        self._loop = None
+        await self.backend.stop()
+
+    def on_broadcast(self, kind: str, handler: Callable[[dict], None]):
+        """Call handler with every broadcast() of this type from other workers."""
+        self._broadcast_handlers[kind] = handler
+
+    def broadcast(self, kind: str, data: dict):
+        """Send data to the other workers' handlers for kind; safe from any thread.
+
+        Does nothing before start() or after stop(), e.g. in scripts.
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        coro = self._broadcast(json.dumps({"type": kind, **data}))
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            spawn(coro)
+        else:
+            asyncio.run_coroutine_threadsafe(coro, loop)
+
+    async def _broadcast(self, message: str):
+        try:
+            await self.backend.broadcast(message)
+        except Exception as e:
+            logger.warning("pubsub_broadcast_failed", extra={"error": str(e)})
+
+    async def _deliver_broadcast(self, message: str):
+        data = json.loads(message)
+        handler = self._broadcast_handlers.get(data.get("type"))
+        if handler is not None:
+            handler(data)
 
-    async def connect(self, websocket: WebSocket, user_id: int):
+    async def connect(self, websocket: WebSocket, user_id: int) -> ClientConnection:
         await websocket.accept()
-        self.active_connections[user_id] = websocket
-        print(f"User {user_id} connected to WebSocket")
+        connection = ClientConnection(
+            websocket, user_id, self.max_queue, self.slow_consumer_policy, self.disconnect
+        )
+        connection.start()
+        metrics.WS_CONNECTIONS_OPENED.inc()
+        metrics.WS_ACTIVE_CONNECTIONS.inc()
+        connections = self.active_connections.setdefault(user_id, set())
+        connections.add(connection)
+        if len(connections) == 1:
+            await self.backend.subscribe(user_id)
+        logger.info("ws_connected", extra={"user_id": user_id, "user_sockets": len(connections)})
+        return connection
 
-    def disconnect(self, user_id: int):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-            print(f"User {user_id} disconnected from WebSocket")
+    async def disconnect(self, connection: ClientConnection, code: int = 1000):
+        await connection.close(code)
+        connections = self.active_connections.get(connection.user_id)
+        if connections and connection in connections:
+            connections.discard(connection)
+            metrics.WS_CONNECTIONS_CLOSED.labels(str(code)).inc()
+            metrics.WS_ACTIVE_CONNECTIONS.dec()
+            if not connections:
+                del self.active_connections[connection.user_id]
+                await self.backend.unsubscribe(connection.user_id)
+            logger.info("ws_disconnected", extra={"user_id": connection.user_id, "code": code})
+
+    async def _deliver_local(self, user_id: int, message: str) -> bool:
+        delivered = False
+        for connection in list(self.active_connections.get(user_id, ())):
+            delivered = connection.send(message) or delivered
+        return delivered
 
     async def send_personal_message(self, message: str, user_id: int):
-        if user_id in self.active_connections:
-            websocket = self.active_connections[user_id]
-            try:
-                await websocket.send_text(message)
-                return True
-            except Exception as e:
-                print(f"Error sending message to user {user_id}: {e}")
-                self.disconnect(user_id)
-                return False
-        return False
+        local_sent = await self._deliver_local(user_id, message)
+        # The user may also (or only) be attached to another worker
+        remote_sent = await self.backend.publish(user_id, message)
+        return local_sent or remote_sent > 0
 
     async def send_chat_message(self, sender_id: int, receiver_id: int, content: str, message_id: int):
         message_data = {
@@ -42,6 +223,7 @@ class ConnectionManager:
         }
         
         message_json = json.dumps(message_data)
+        metrics.CHAT_MESSAGES.inc()
         
         receiver_sent = await self.send_personal_message(message_json, receiver_id)
         
@@ -62,11 +244,39 @@ class ConnectionManager:
         
         return await self.send_personal_message(notification_json, user_id)
 
+    def run_from_thread(self, func, *args):
+        """Run a send coroutine from a sync route's worker thread.
+
+        The message is already persisted by the caller, so delivery failures
+        are logged rather than raised.
+        """
+        try:
+            return anyio.from_thread.run(func, *args)
+        except Exception as e:
+            logger.warning("ws_send_from_thread_failed", extra={"func": func.__name__, "error": str(e)})
+            return False
+
     def is_user_online(self, user_id: int) -> bool:
-        return user_id in self.active_connections
+        """Whether the user has a socket on this worker."""
+        return bool(self.active_connections.get(user_id))
+
+    async def is_online(self, user_id: int) -> bool:
+        """Whether the user has a socket on any worker."""
+        return self.is_user_online(user_id) or await self.backend.is_online(user_id)
 
     def get_online_users(self) -> List[int]:
         return list(self.active_connections.keys())
 
+    def connection_count(self) -> int:
+        return sum(len(connections) for connections in self.active_connections.values())
+
+    def queued_frames(self) -> int:
+        return sum(
+            connection.queue.qsize()
+            for connections in self.active_connections.values()
+            for connection in connections
+        )
+
 
 manager = ConnectionManager()
+metrics.WS_SEND_QUEUE_DEPTH.set_function(manager.queued_frames)
@@ -0,0 +1,320 @@
+"""Load and latency benchmark for the API and the chat WebSocket.
+
+Boots uvicorn against a scratch database (or targets --base-url), seeds
+users and accepted connections through the API, then drives a weighted
+mix of HTTP operations alongside WebSocket clients chatting in pairs.
+Prints a JSON report with throughput and p50/p95/p99 latency per
+operation; pass --output to also write it to a file for comparison
+between runs.
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.load --duration 30 --output before.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+import websockets
+
+API = "/api/v1"
+
+# Relative weight of each HTTP operation in the mix
+HTTP_MIX = {
+    "create_user": 2,
+    "send_and_accept_request": 3,
+    "chat_history": 30,
+    "notifications_poll": 40,
+    "notification_count": 25,
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, operation: str, seconds: float, ok: bool = True):
+        if ok:
+            self.latencies[operation].append(seconds)
+        else:
+            self.errors[operation] += 1
+
+    def report(self, elapsed: float) -> dict:
+        operations = {}
+        for operation in sorted(set(self.latencies) | set(self.errors)):
+            samples = sorted(self.latencies[operation])
+            operations[operation] = {
+                "count": len(samples),
+                "errors": self.errors[operation],
+                "throughput_per_s": round(len(samples) / elapsed, 2),
+                "latency_ms": summarize(samples),
+            }
+        return operations
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(samples) - 1, math.ceil(pct / 100 * len(samples)) - 1))
+    return samples[index]
+
+
+def summarize(samples: List[float]) -> dict:
+    if not samples:
+        return {}
+    return {
+        "mean": round(sum(samples) / len(samples) * 1000, 3),
+        "p50": round(percentile(samples, 50) * 1000, 3),
+        "p95": round(percentile(samples, 95) * 1000, 3),
+        "p99": round(percentile(samples, 99) * 1000, 3),
+        "max": round(samples[-1] * 1000, 3),
+    }
+
+
+async def timed(recorder: Recorder, operation: str, request):
+    started = time.perf_counter()
+    try:
+        response = await request
+        ok = response.status_code < 400
+    except httpx.HTTPError:
+        response, ok = None, False
+    recorder.record(operation, time.perf_counter() - started, ok)
+    return response
+
+
+async def seed(client: httpx.AsyncClient, users: int, degree: int) -> dict:
+    """Create users and give each one ``degree`` accepted connections."""
+    # Not from the seeded rng: reruns against a persistent --base-url
+    # database would otherwise reuse the usernames of the previous run
+    run_id = int.from_bytes(os.urandom(4), "big")
+    user_ids = []
+    for i in range(users):
+        response = await client.post(f"{API}/users/", json={"username": f"bench-{run_id:x}-{i}"})
+        response.raise_for_status()
+        user_ids.append(response.json()["id"])
+
+    connections = defaultdict(set)
+    for index, user_id in enumerate(user_ids):
+        for step in range(1, degree + 1):
+            other_id = user_ids[(index + step) % len(user_ids)]
+            if other_id in connections[user_id] or other_id == user_id:
+                continue
+            response = await client.post(f"{API}/connections/send", params={"sender_id": user_id},
+                                         json={"receiver_id": other_id})
+            response.raise_for_status()
+            await client.post(f"{API}/connections/{response.json()['id']}/accept")
+            connections[user_id].add(other_id)
+            connections[other_id].add(user_id)
+    return {"user_ids": user_ids, "connections": {k: sorted(v) for k, v in connections.items()}, "run_id": run_id}
+
+
+async def http_worker(client, recorder, data, deadline, rng: random.Random):
+    operations = list(HTTP_MIX)
+    weights = [HTTP_MIX[op] for op in operations]
+    user_ids = data["user_ids"]
+    while time.perf_counter() < deadline:
+        operation = rng.choices(operations, weights)[0]
+        user_id = rng.choice(user_ids)
+        if operation == "create_user":
+            username = f"bench-{data['run_id']:x}-new-{rng.getrandbits(48):x}"
+            response = await timed(recorder, operation, client.post(f"{API}/users/", json={"username": username}))
+            if response is not None and response.status_code == 200:
+                user_ids.append(response.json()["id"])
+        elif operation == "send_and_accept_request":
+            other_id = rng.choice(user_ids)
+            if other_id == user_id:
+                continue
+            started = time.perf_counter()
+            ok = False
+            try:
+                sent = await client.post(f"{API}/connections/send", params={"sender_id": user_id},
+                                         json={"receiver_id": other_id})
+                if sent.status_code == 200:
+                    accepted = await client.post(f"{API}/connections/{sent.json()['id']}/accept")
+                    ok = accepted.status_code == 200
+            except httpx.HTTPError:
+                pass
+            recorder.record(operation, time.perf_counter() - started, ok)
+        elif operation == "chat_history":
+            peers = data["connections"].get(user_id)
+            if not peers:
+                continue
+            await timed(recorder, operation, client.get(
+                f"{API}/chat/history/{rng.choice(peers)}", params={"current_user_id": user_id, "limit": 50}))
+        elif operation == "notifications_poll":
+            await timed(recorder, operation, client.get(
+                f"{API}/notifications/", params={"user_id": user_id, "limit": 20}))
+        elif operation == "notification_count":
+            await timed(recorder, operation, client.get(
+                f"{API}/notifications/count", params={"user_id": user_id}))
+
+
+async def ws_client(ws_url, recorder, user_id, peer_id, deadline, interval, rng: random.Random):
+    """Chat with one peer; measures server ack latency and peer delivery latency."""
+    started = time.perf_counter()
+    try:
+        websocket = await websockets.connect(f"{ws_url}{API}/chat/ws/{user_id}")
+    except Exception:
+        recorder.record("ws_connect", time.perf_counter() - started, ok=False)
+        return
+    recorder.record("ws_connect", time.perf_counter() - started)
+    pending: Dict[int, float] = {}
+
+    async def reader():
+        async for raw in websocket:
+            frame = json.loads(raw)
+            now = time.perf_counter()
+            if frame.get("type") == "message":
+                content = frame.get("content", "")
+                if frame.get("receiver_id") == user_id and content.startswith("bench:"):
+                    sent_at = float(content.split(":", 2)[1])
+                    recorder.record("ws_message_delivery", time.time() - sent_at)
+            elif frame.get("type") == "message_sent":
+                # Acks arrive in send order for a single socket
+                if pending:
+                    key = min(pending)
+                    recorder.record("ws_message_ack", now - pending.pop(key))
+            elif frame.get("type") == "error":
+                if pending:
+                    pending.pop(min(pending))
+                recorder.record("ws_message_ack", 0, ok=False)
+
+    read_task = asyncio.create_task(reader())
+    sequence = 0
+    try:
+        while time.perf_counter() < deadline:
+            sequence += 1
+            pending[sequence] = time.perf_counter()
+            await websocket.send(json.dumps({
+                "receiver_id": peer_id,
+                "content": f"bench:{time.time()}:{sequence}",
+            }))
+            await asyncio.sleep(rng.expovariate(1 / interval))
+        await asyncio.sleep(1)
+    finally:
+        read_task.cancel()
+        await websocket.close()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def boot_server(database_url: str, workers: int, port: int) -> subprocess.Popen:
+    # Rate limits would cap the load this benchmark is trying to generate
+    env = dict(os.environ, DATABASE_URL=database_url, LOG_LEVEL="WARNING", RATE_LIMIT_BACKEND="none")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env,
+    )
+
+
+async def wait_ready(base_url: str, timeout: float = 30):
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.perf_counter() < deadline:
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become ready")
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30) as client:
+        data = await seed(client, args.users, args.degree)
+
+        ws_url = args.base_url.replace("http", "ws", 1)
+        pairs = []
+        for user_id in data["user_ids"][: args.ws_clients]:
+            peers = data["connections"].get(user_id)
+            if peers:
+                pairs.append((user_id, rng.choice(peers)))
+
+        started = time.perf_counter()
+        deadline = started + args.duration
+        tasks = [
+            http_worker(client, recorder, data, deadline, random.Random(rng.random()))
+            for _ in range(args.concurrency)
+        ] + [
+            ws_client(ws_url, recorder, user_id, peer_id, deadline, args.ws_interval, random.Random(rng.random()))
+            for user_id, peer_id in pairs
+        ]
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    return {
+        "started_at": datetime.datetime.utcnow().isoformat() + "Z",
+        "duration_s": round(elapsed, 3),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output",)},
+        "operations": recorder.report(elapsed),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="Benchmark a running server instead of booting one")
+    parser.add_argument("--database-url", help="Database for the booted server (default: scratch SQLite file)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the booted server")
+    parser.add_argument("--users", type=int, default=200, help="Users to seed")
+    parser.add_argument("--degree", type=int, default=5, help="Accepted connections per seeded user")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run the mix")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent HTTP workers")
+    parser.add_argument("--ws-clients", type=int, default=50, help="Concurrent WebSocket clients")
+    parser.add_argument("--ws-interval", type=float, default=0.5, help="Mean seconds between messages per client")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the workload")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = None
+    scratch = None
+    if not args.base_url:
+        if not args.database_url:
+            scratch = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+            args.database_url = f"sqlite:///{scratch.name}"
+        port = free_port()
+        args.base_url = f"http://127.0.0.1:{port}"
+        server = boot_server(args.database_url, args.workers, port)
+    try:
+        if server:
+            asyncio.run(wait_ready(args.base_url))
+        report = asyncio.run(run(args))
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+        if scratch:
+            os.unlink(scratch.name)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Micro-benchmark of the list endpoints' response paths.
+
+For each of GET /users/, GET /chat/history/{id} and GET /notifications/
+it times two ways of producing the same JSON body from a page of rows:
+
+- ``orm``: load ORM objects, validate them into the response schema with
+  from_attributes, dump in JSON mode and encode with json.dumps, as
+  FastAPI does for a response_model.
+- ``fast``: what the endpoints do now, i.e. select only the schema's
+  columns through crud and encode plain dicts with orjson.
+
+Both bodies are decoded and compared before timing, so a drift between
+the fast path and the schema fails the run. Runs against a scratch SQLite
+database unless --database-url is given.
+
+    python -m benchmarks.serialization --rows 100 --iterations 2000
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+import orjson
+
+
+def json_dumps(content) -> bytes:
+    # Same settings as starlette's JSONResponse.render
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def seed(db, models, rows: int):
+    users = [models.User(username=f"bench_user_{i}") for i in range(max(rows, 2))]
+    db.add_all(users)
+    db.flush()
+    me, peer = users[0], users[1]
+    started = datetime.datetime(2025, 1, 1)
+    db.add_all(
+        models.Message(
+            sender_id=(me, peer)[i % 2].id,
+            receiver_id=(peer, me)[i % 2].id,
+            content=f"message {i} " + "x" * (i % 40),
+            created_at=started + datetime.timedelta(seconds=i, microseconds=i),
+        )
+        for i in range(rows)
+    )
+    db.add_all(
+        models.Notification(
+            user_id=me.id,
+            type=models.NotificationType.new_message,
+            title="New Message",
+            message=f"preview {i}",
+            related_user_id=users[i % len(users)].id,
+            created_at=started + datetime.timedelta(minutes=i),
+        )
+        for i in range(rows)
+    )
+    db.commit()
+    return me.id, peer.id
+
+
+def build_cases(db, crud, models, schemas, me: int, peer: int, rows: int):
+    from app.loaders import UserLoader
+
+    def users_orm():
+        users = db.query(models.User).order_by(models.User.id).limit(rows).all()
+        return json_dumps([schemas.UserOut.model_validate(u).model_dump(mode="json") for u in users])
+
+    def users_fast():
+        users = crud.get_users(db, limit=rows)
+        return orjson.dumps([{"id": user.id, "username": user.username} for user in users])
+
+    def history_orm():
+        messages = db.query(models.Message).filter(
+            crud.conversation_filter(me, peer)
+        ).order_by(models.Message.created_at.asc()).limit(rows).all()
+        body = schemas.ChatHistoryResponse(messages=messages, total_count=rows, page=1, limit=rows)
+        return json_dumps(body.model_dump(mode="json"))
+
+    def history_fast():
+        messages = crud.get_chat_history(db, me, peer, limit=rows)
+        return orjson.dumps({
+            "messages": [message._asdict() for message in messages],
+            "total_count": rows,
+            "page": 1,
+            "limit": rows,
+        })
+
+    def notifications_orm():
+        notifications = db.query(models.Notification).filter(
+            models.Notification.user_id == me
+        ).order_by(models.Notification.created_at.desc()).limit(rows).all()
+        users = UserLoader(db).want(n.related_user_id for n in notifications)
+        body = schemas.NotificationResponse(
+            notifications=[
+                schemas.NotificationWithDetails(
+                    **schemas.NotificationOut.model_validate(n).model_dump(),
+                    related_user_username=users.username(n.related_user_id),
+                )
+                for n in notifications
+            ],
+            total_count=rows,
+            unread_count=rows,
+        )
+        return json_dumps(body.model_dump(mode="json"))
+
+    def notifications_fast():
+        notifications = crud.get_user_notifications(db, me, limit=rows)
+        users = UserLoader(db).want(n.related_user_id for n in notifications)
+        return orjson.dumps({
+            "notifications": [
+                {
+                    "id": n.id,
+                    "user_id": n.user_id,
+                    "type": n.type,
+                    "title": n.title,
+                    "message": n.message,
+                    "is_read": n.is_read,
+                    "created_at": n.created_at,
+                    "message_count": n.message_count,
+                    "related_user_id": n.related_user_id,
+                    "related_user_username": users.username(n.related_user_id),
+                    "related_request_id": n.related_request_id,
+                    "related_message_id": n.related_message_id,
+                }
+                for n in notifications
+            ],
+            "total_count": rows,
+            "unread_count": rows,
+        })
+
+    return {
+        "users": (users_orm, users_fast),
+        "chat_history": (history_orm, history_fast),
+        "notifications": (notifications_orm, notifications_fast),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100, help="Rows per page")
+    parser.add_argument("--iterations", type=int, default=2000, help="Calls per timing")
+    parser.add_argument("--repeat", type=int, default=5, help="Timings per path; the best is reported")
+    parser.add_argument("--database-url", help="Empty database to use instead of a scratch SQLite file")
+    parser.add_argument("--output", help="Also write the JSON report here")
+    args = parser.parse_args()
+
+    scratch = None
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        scratch = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        os.environ["DATABASE_URL"] = f"sqlite:///{scratch.name}"
+    # The user cache would turn the users "fast" path into a dict lookup
+    os.environ["USER_CACHE_BACKEND"] = "none"
+
+    from app import crud, models, schemas
+    from app.core.database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        me, peer = seed(db, models, args.rows)
+        report = {}
+        for name, (orm_path, fast_path) in build_cases(db, crud, models, schemas, me, peer, args.rows).items():
+            if json.loads(orm_path()) != json.loads(fast_path()):
+                sys.exit(f"{name}: fast path body differs from the response schema's")
+            timings = {}
+            for label, path in (("orm", orm_path), ("fast", fast_path)):
+                best = min(timeit.repeat(path, number=args.iterations, repeat=args.repeat))
+                timings[label] = round(best / args.iterations * 1e6, 1)
+            report[name] = {
+                "orm_us": timings["orm"],
+                "fast_us": timings["fast"],
+                "speedup": round(timings["orm"] / timings["fast"], 2),
+            }
+            db.expunge_all()
+    finally:
+        db.close()
+        if scratch is not None:
+            os.unlink(scratch.name)
+
+    output = json.dumps({"rows": args.rows, "iterations": args.iterations, "results": report}, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Check that the hot crud queries are planned against their composite indexes.
+
+Runs each crud function inside a transaction that is rolled back, captures
+the first SELECT it emits from the named table and EXPLAINs it. Exits
+non-zero if a plan does not mention the expected index. The same checks run
+under pytest against a migrated SQLite database (tests/test_query_plans.py).
+
+    DATABASE_URL=... python -m scripts.check_query_plans
+"""
+import contextlib
+import re
+import sys
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.core.database import Base, engine
+
+CHECKS = [
+    ("get_chat_history",
+     lambda db: crud.get_chat_history(db, 1, 2),
+     "messages",
+     {"ix_messages_sender_receiver_created_at"}),
+    ("check_users_connected",
+     lambda db: crud.load_connected_user_ids(db, 1),
+     "connection_requests",
+     {"ix_connection_requests_sender_receiver_status", "ix_connection_requests_receiver_status"}),
+    ("send_request duplicate check",
+     lambda db: crud.send_request(db, 1, 2),
+     "connection_requests",
+     {"ix_connection_requests_sender_receiver_status"}),
+    ("get_user_notifications",
+     lambda db: crud.get_user_notifications(db, 1, unread_only=True),
+     "notifications",
+     {"ix_notifications_user_read_created_at"}),
+    ("get_user_notifications (all)",
+     lambda db: crud.get_user_notifications(db, 1),
+     "notifications",
+     {"ix_notifications_user_read_created_at"}),
+    # The badge count reads the per-user counter row, not notifications
+    ("get_notification_count",
+     lambda db: crud.get_notification_count(db, 1),
+     "notification_counters",
+     {"notification_counters_pkey", "INTEGER PRIMARY KEY"}),
+]
+
+
+def explain(connection, statement, parameters):
+    if connection.dialect.name == "postgresql":
+        rows = connection.exec_driver_sql("EXPLAIN " + statement, parameters).all()
+        return "\n".join(row[0] for row in rows)
+    if connection.dialect.name == "sqlite":
+        rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+        return "\n".join(row[-1] for row in rows)
+    raise SystemExit(f"Unsupported dialect: {connection.dialect.name}")
+
+
+def check(connection, name, run, table, expected_indexes):
+    statements = []
+    from_table = re.compile(rf"\bFROM {table}\b", re.IGNORECASE)
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and from_table.search(statement):
+            statements.append((statement, parameters))
+
+    event.listen(connection, "before_cursor_execute", capture)
+    try:
+        with Session(bind=connection, join_transaction_mode="create_savepoint") as db:
+            run(db)
+    finally:
+        event.remove(connection, "before_cursor_execute", capture)
+
+    if not statements:
+        return False, f"no SELECT from {table} captured"
+    statement, parameters = statements[0]
+    plan = explain(connection, statement, parameters)
+    return any(index in plan for index in expected_indexes), plan
+
+
+@contextlib.contextmanager
+def checking_connection(bind):
+    """A connection whose transaction is rolled back once the checks are done."""
+    with bind.connect() as connection:
+        transaction = connection.begin()
+        if connection.dialect.name == "postgresql":
+            # Tiny or empty tables would otherwise always get a seq scan
+            connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        try:
+            yield connection
+        finally:
+            transaction.rollback()
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    failed = False
+    with checking_connection(engine) as connection:
+        for name, run, table, expected_indexes in CHECKS:
+            ok, plan = check(connection, name, run, table, expected_indexes)
+            print(f"{'ok  ' if ok else 'FAIL'} {name}")
+            if not ok:
+                failed = True
+                print("     " + plan.replace("\n", "\n     "))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
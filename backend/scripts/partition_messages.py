@@ -0,0 +1,223 @@
+"""Maintain the monthly partitions of messages and archive old months.
+
+    python -m scripts.partition_messages create --months-ahead 3
+    python -m scripts.partition_messages create --from 2023-06
+    python -m scripts.partition_messages archive --before 2025-01
+
+create (PostgreSQL only) adds the messages_pYYYYMM partitions from --from
+(default: the current month) through --months-ahead months from now; run it
+from cron well before a month starts. Rows of a month without a partition
+land in messages_default, e.g. after a backfill; create moves them into the
+new partition in the same transaction.
+
+archive first splits months older than --before out of messages_default the
+same way, then exports every month older than --before to a compressed
+segment in MESSAGE_ARCHIVE_DIR (see app/message_archive.py) and records its
+absolute path in message_archive_segments and where each conversation sits
+in it in message_archive_conversations. It then drops the month's
+partition on PostgreSQL, or deletes its rows on other databases. Both history
+endpoints keep serving archived months from the segments. Segments archived
+before message_archive_conversations existed are indexed from their
+.index.json files at the start of each run.
+"""
+import argparse
+import datetime
+import os
+import sys
+
+from sqlalchemy import case, delete, func, insert, select, text
+
+from app import message_archive, models
+from app.core import config
+from app.core.database import SessionLocal
+
+
+def add_months(value: datetime.datetime, months: int) -> datetime.datetime:
+    years, month = divmod(value.month - 1 + months, 12)
+    return datetime.datetime(value.year + years, month + 1, 1)
+
+
+def parse_month(value: str) -> datetime.datetime:
+    return datetime.datetime.strptime(value, "%Y-%m")
+
+
+def partition_name(month: datetime.datetime) -> str:
+    return f"messages_p{month:%Y%m}"
+
+
+def is_partitioned(db) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = 'messages'"
+    )).first() is not None
+
+
+def existing_partitions(db) -> list:
+    names = db.scalars(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = 'messages' AND child.relname LIKE 'messages_p%'"
+    )).all()
+    return sorted(datetime.datetime.strptime(name[len("messages_p"):], "%Y%m") for name in names)
+
+
+def create_partition(db, start: datetime.datetime) -> int:
+    """Create start's partition unless it exists; returns rows moved out of messages_default.
+
+    A partition can't be created over rows already in the default partition,
+    so those months are built as a plain table, filled from the default
+    partition and attached, which also creates the partitioned indexes.
+    """
+    name = partition_name(start)
+    bounds = f"FROM ('{start:%Y-%m-%d}') TO ('{add_months(start, 1):%Y-%m-%d}')"
+    if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+        return 0
+    in_month = f"created_at >= '{start:%Y-%m-%d}' AND created_at < '{add_months(start, 1):%Y-%m-%d}'"
+    if db.execute(text(f"SELECT 1 FROM messages_default WHERE {in_month} LIMIT 1")).first() is None:
+        db.execute(text(f"CREATE TABLE {name} PARTITION OF messages FOR VALUES {bounds}"))
+        return 0
+    db.execute(text(f"CREATE TABLE {name} (LIKE messages INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    moved = db.execute(text(
+        f"WITH moved AS (DELETE FROM messages_default WHERE {in_month} RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    )).rowcount
+    db.execute(text(f"ALTER TABLE messages ATTACH PARTITION {name} FOR VALUES {bounds}"))
+    return moved
+
+
+def create_partitions(db, months_ahead: int, first: datetime.datetime = None):
+    if not is_partitioned(db):
+        print("messages is not partitioned on this database; nothing to do")
+        return
+    now = datetime.datetime.utcnow()
+    month = first or datetime.datetime(now.year, now.month, 1)
+    last = add_months(datetime.datetime(now.year, now.month, 1), months_ahead)
+    while month <= last:
+        moved = create_partition(db, month)
+        db.commit()
+        print(f"{partition_name(month)} ready" + (f", moved {moved} rows from messages_default" if moved else ""))
+        month = add_months(month, 1)
+
+
+def split_default(db, before: datetime.datetime):
+    """Give every month older than before that still has rows in messages_default its own partition."""
+    oldest = db.execute(text(
+        "SELECT min(created_at) FROM messages_default WHERE created_at < :before"
+    ), {"before": before}).scalar()
+    if oldest is None:
+        return
+    month = datetime.datetime(oldest.year, oldest.month, 1)
+    while add_months(month, 1) <= before:
+        moved = create_partition(db, month)
+        db.commit()
+        if moved:
+            print(f"{partition_name(month)}: moved {moved} rows from messages_default")
+        month = add_months(month, 1)
+
+
+def months_to_archive(db, before: datetime.datetime, partitioned: bool) -> list:
+    if partitioned:
+        return [month for month in existing_partitions(db) if add_months(month, 1) <= before]
+    oldest = db.query(func.min(models.Message.created_at)).scalar()
+    if oldest is None:
+        return []
+    months = []
+    month = datetime.datetime(oldest.year, oldest.month, 1)
+    while add_months(month, 1) <= before:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def archive_month(db, start: datetime.datetime, archive_dir: str, partitioned: bool) -> int:
+    Message = models.Message
+    end = add_months(start, 1)
+    in_month = (Message.created_at >= start, Message.created_at < end)
+    low_id = case((Message.sender_id < Message.receiver_id, Message.sender_id), else_=Message.receiver_id)
+    high_id = case((Message.sender_id < Message.receiver_id, Message.receiver_id), else_=Message.sender_id)
+    rows = db.execute(
+        select(Message.id, Message.sender_id, Message.receiver_id, Message.content, Message.created_at)
+        .where(*in_month)
+        .order_by(low_id, high_id, Message.created_at, Message.id)
+        .execution_options(yield_per=10_000)
+    )
+    # Stored absolute: the API server reading it back runs from another directory
+    base = os.path.abspath(os.path.join(archive_dir, f"messages_{start:%Y%m}"))
+    index = message_archive.write_segment(base, (dict(row._mapping) for row in rows))
+    count = sum(location[2] for location in index.values())
+    
+    segment = models.MessageArchiveSegment(path=base, range_start=start, range_end=end, row_count=count)
+    db.add(segment)
+    db.flush()
+    if index:
+        db.execute(insert(models.MessageArchiveConversation), message_archive.index_rows(segment.id, base, index))
+    if partitioned:
+        db.execute(text(f"ALTER TABLE messages DETACH PARTITION {partition_name(start)}"))
+        db.execute(text(f"DROP TABLE {partition_name(start)}"))
+    else:
+        db.execute(delete(Message).where(*in_month))
+    db.commit()
+    return count
+
+
+def index_segments(db):
+    """Load the index files of segments archived before message_archive_conversations existed."""
+    Segment = models.MessageArchiveSegment
+    Entry = models.MessageArchiveConversation
+    unindexed = db.scalars(
+        select(Segment).where(~select(Entry.segment_id).where(Entry.segment_id == Segment.id).exists())
+    ).all()
+    for segment in unindexed:
+        try:
+            index = message_archive.load_index(segment.path)
+        except FileNotFoundError:
+            print(f"{segment.path}: index file missing, not indexed", file=sys.stderr)
+            continue
+        if index:
+            db.execute(insert(Entry), message_archive.index_rows(segment.id, segment.path, index))
+            db.commit()
+            print(f"{segment.range_start:%Y-%m}: indexed {len(index)} conversations")
+
+
+def archive(db, before: datetime.datetime, archive_dir: str):
+    index_segments(db)
+    partitioned = is_partitioned(db)
+    if partitioned:
+        split_default(db, before)
+    archived = set(db.scalars(select(models.MessageArchiveSegment.range_start)).all())
+    for month in months_to_archive(db, before, partitioned):
+        if month in archived:
+            print(f"{month:%Y-%m} already archived, skipping", file=sys.stderr)
+            continue
+        count = archive_month(db, month, archive_dir, partitioned)
+        print(f"{month:%Y-%m}: archived {count} messages")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="Create upcoming monthly partitions")
+    create.add_argument("--months-ahead", type=int, default=3)
+    create.add_argument("--from", dest="first", type=parse_month,
+                        help="First month to create, as YYYY-MM; defaults to the current month")
+    archive_parser = commands.add_parser("archive", help="Export and drop months older than --before")
+    archive_parser.add_argument("--before", required=True, type=parse_month,
+                                help="First month to keep, as YYYY-MM")
+    archive_parser.add_argument("--archive-dir", default=config.MESSAGE_ARCHIVE_DIR)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "create":
+            create_partitions(db, args.months_ahead, args.first)
+        else:
+            archive(db, args.before, args.archive_dir)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Apply the notification retention policy once.
+
+Uses the same settings as the background job (NOTIFICATION_TTL_DAYS,
+NOTIFICATION_TTLS, NOTIFICATION_UNREAD_TTL_DAYS, NOTIFICATION_RETENTION_MODE);
+the flags below override them for this run.
+
+    DATABASE_URL=... python -m scripts.purge_notifications --mode archive
+"""
+import argparse
+
+from app.core import config
+from app.core.database import SessionLocal
+from app.retention import RETENTION_MODES, parse_ttls, purge_notifications
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=RETENTION_MODES, default=config.NOTIFICATION_RETENTION_MODE)
+    parser.add_argument("--ttl-days", type=float, default=config.NOTIFICATION_TTL_DAYS)
+    parser.add_argument("--ttls", default=config.NOTIFICATION_TTLS, help="Per-type overrides, e.g. new_message=30")
+    parser.add_argument("--unread-ttl-days", type=float, default=config.NOTIFICATION_UNREAD_TTL_DAYS)
+    parser.add_argument("--batch-size", type=int, default=config.NOTIFICATION_RETENTION_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        removed = purge_notifications(
+            db,
+            ttls=parse_ttls(args.ttls, args.ttl_days),
+            unread_ttl_days=args.unread_ttl_days,
+            batch_size=args.batch_size,
+            mode=args.mode
+        )
+    finally:
+        db.close()
+    for notification_type, count in removed.items():
+        print(f"{notification_type}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""Recompute the counter and conversation summary tables from the source tables.
+
+Run once after the migration that adds the counter tables, and any time
+the counters are suspected to have drifted. The rebuild is one
+transaction; run it off-peak on large tables.
+
+    DATABASE_URL=... python -m scripts.repair_counters
+"""
+from app import crud
+from app.core.database import SessionLocal
+
+
+def main():
+    db = SessionLocal()
+    try:
+        crud.recompute_counters(db)
+    finally:
+        db.close()
+    print("Counters recomputed")
+
+
+if __name__ == "__main__":
+    main()
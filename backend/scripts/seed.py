@@ -0,0 +1,216 @@
+"""Generate and bulk-load synthetic users, connections and messages.
+
+Rows are generated lazily and streamed into the tables declared in
+app/models.py in fixed-size batches: COPY ... FROM STDIN on PostgreSQL,
+executemany inside one transaction per batch on SQLite. The same --seed
+and arguments always produce the same data.
+
+Distributions:
+  * connections per user are Pareto(--degree-alpha) scaled by
+    --min-degree and capped at --max-degree; targets are picked
+    preferentially, so popular users also receive more requests
+  * request status is accepted / pending / rejected by the given ratios
+  * messages go to accepted connections with a power-law skew
+    (--message-skew) so a few conversations are very long
+  * timestamps are uniform over the --days before --end
+
+    DATABASE_URL=... python -m scripts.seed --users 1000000 --messages 100000000
+"""
+import argparse
+import bisect
+import csv
+import datetime
+import io
+import itertools
+import random
+import sys
+import time
+from array import array
+
+from sqlalchemy import func, select
+
+from app import crud, models
+from app.core.database import Base, SessionLocal, engine
+from app.user_cache import user_cache
+
+WORDS = (
+    "hey hi hello ok sure thanks great see you soon tomorrow today meeting call "
+    "lunch coffee project update done later maybe yes no lol nice cool busy free "
+    "weekend plan idea check send file link photo love this that what when where"
+).split()
+
+
+class BulkWriter:
+    """Streams row tuples into one table through the fastest path the dialect offers."""
+
+    def __init__(self, raw_connection, dialect: str, table, columns, batch_size: int):
+        self.raw_connection = raw_connection
+        self.dialect = dialect
+        self.table = table
+        self.columns = columns
+        self.batch_size = batch_size
+        self.written = 0
+
+    def write(self, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch):
+        cursor = self.raw_connection.cursor()
+        if self.dialect == "postgresql":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(batch)
+            buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY {self.table.name} ({', '.join(self.columns)}) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+        else:
+            placeholders = ", ".join("?" for _ in self.columns)
+            cursor.executemany(
+                f"INSERT INTO {self.table.name} ({', '.join(self.columns)}) VALUES ({placeholders})",
+                batch,
+            )
+        self.raw_connection.commit()
+        cursor.close()
+        self.written += len(batch)
+        print(f"  {self.table.name}: {self.written} rows", file=sys.stderr, end="\r")
+
+
+def format_timestamp(value: datetime.datetime) -> str:
+    # Matches how SQLAlchemy stores DateTime on SQLite and is valid COPY input
+    return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def generate_users(first_id: int, count: int, prefix: str):
+    for user_id in range(first_id, first_id + count):
+        yield (user_id, f"{prefix}{user_id}")
+
+
+def generate_connections(rng: random.Random, user_ids: range, args, accepted_edges):
+    """Yield connection_requests rows; accepted pairs are appended to accepted_edges."""
+    popularity = [rng.paretovariate(args.degree_alpha) for _ in user_ids]
+    cum_weights = list(itertools.accumulate(popularity))
+    total = cum_weights[-1]
+    span = args.days * 86400
+    statuses = [models.RequestStatus.accepted.name, models.RequestStatus.pending.name,
+                models.RequestStatus.rejected.name]
+    status_weights = [args.accepted_ratio, args.pending_ratio,
+                      max(0.0, 1 - args.accepted_ratio - args.pending_ratio)]
+
+    for index, sender_id in enumerate(user_ids):
+        degree = min(args.max_degree, int(args.min_degree * popularity[index]))
+        targets = set()
+        for _ in range(degree * 2):
+            if len(targets) >= degree:
+                break
+            receiver_id = user_ids[bisect.bisect_left(cum_weights, rng.random() * total)]
+            if receiver_id != sender_id:
+                targets.add(receiver_id)
+        for receiver_id in sorted(targets):
+            status = rng.choices(statuses, status_weights)[0]
+            if status == models.RequestStatus.accepted.name:
+                accepted_edges[0].append(sender_id)
+                accepted_edges[1].append(receiver_id)
+            created_at = args.end - datetime.timedelta(seconds=rng.random() * span)
+            yield (sender_id, receiver_id, status, format_timestamp(created_at))
+
+
+def generate_messages(rng: random.Random, accepted_edges, args):
+    senders, receivers = accepted_edges
+    edges = len(senders)
+    span = args.days * 86400
+    for _ in range(args.messages):
+        # u ** skew concentrates picks on low indices; edge order is random
+        edge = min(edges - 1, int(edges * rng.random() ** args.message_skew))
+        sender_id, receiver_id = senders[edge], receivers[edge]
+        if rng.random() < 0.5:
+            sender_id, receiver_id = receiver_id, sender_id
+        content = " ".join(rng.choices(WORDS, k=rng.randint(1, args.max_words)))
+        created_at = args.end - datetime.timedelta(seconds=rng.random() * span)
+        yield (sender_id, receiver_id, content, format_timestamp(created_at))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-degree", type=int, default=2, help="Scale of the Pareto degree draw")
+    parser.add_argument("--max-degree", type=int, default=5_000)
+    parser.add_argument("--degree-alpha", type=float, default=1.5, help="Pareto shape; lower is heavier-tailed")
+    parser.add_argument("--accepted-ratio", type=float, default=0.8)
+    parser.add_argument("--pending-ratio", type=float, default=0.15)
+    parser.add_argument("--message-skew", type=float, default=3.0, help="Power-law skew of messages per conversation")
+    parser.add_argument("--max-words", type=int, default=20)
+    parser.add_argument("--days", type=float, default=365)
+    parser.add_argument("--end", type=datetime.datetime.fromisoformat, default=datetime.datetime(2025, 9, 1),
+                        help="Newest timestamp generated (fixed by default so runs are reproducible)")
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--username-prefix", default="seed_")
+    parser.add_argument("--skip-counters", action="store_true", help="Don't rebuild derived tables and indexes afterwards")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    dialect = engine.dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        raise SystemExit(f"Unsupported dialect: {dialect}")
+
+    Base.metadata.create_all(bind=engine)
+    with engine.connect() as connection:
+        first_id = (connection.execute(select(func.max(models.User.id))).scalar() or 0) + 1
+
+    started = time.perf_counter()
+    raw_connection = engine.raw_connection()
+    try:
+        user_ids = range(first_id, first_id + args.users)
+        BulkWriter(raw_connection, dialect, models.User.__table__, ["id", "username"], args.batch_size).write(
+            generate_users(first_id, args.users, args.username_prefix)
+        )
+        if dialect == "postgresql":
+            cursor = raw_connection.cursor()
+            cursor.execute("SELECT setval(pg_get_serial_sequence('users', 'id'), (SELECT max(id) FROM users))")
+            raw_connection.commit()
+        print(file=sys.stderr)
+
+        accepted_edges = (array("q"), array("q"))
+        BulkWriter(raw_connection, dialect, models.ConnectionRequest.__table__,
+                   ["sender_id", "receiver_id", "status", "created_at"], args.batch_size).write(
+            generate_connections(rng, user_ids, args, accepted_edges)
+        )
+        print(file=sys.stderr)
+
+        if accepted_edges[0] and args.messages:
+            BulkWriter(raw_connection, dialect, models.Message.__table__,
+                       ["sender_id", "receiver_id", "content", "created_at"], args.batch_size).write(
+                generate_messages(rng, accepted_edges, args)
+            )
+            print(file=sys.stderr)
+    finally:
+        raw_connection.close()
+    # Users were inserted behind crud's back; a shared cache may still hold
+    # snapshots or pages from whatever this database held before
+    user_cache.clear()
+
+    if not args.skip_counters:
+        db = SessionLocal()
+        try:
+            crud.recompute_counters(db)
+            crud.rebuild_search_index(db)
+        finally:
+            db.close()
+    print(f"Seeded {args.users} users, {len(accepted_edges[0])} accepted connections, "
+          f"{args.messages if accepted_edges[0] else 0} messages in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import os
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# app.core.database builds its engines from DATABASE_URL at import time, so
+# point it at a scratch file before any test module imports the app
+_scratch = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+_scratch.close()
+os.environ["DATABASE_URL"] = f"sqlite:///{_scratch.name}"
+
+
+@pytest.fixture(scope="session")
+def migrated_engine():
+    """The app's engine on a SQLite database built by `alembic upgrade head` alone."""
+    from alembic import command
+    from alembic.config import Config
+
+    from app.core.database import engine
+
+    command.upgrade(Config(os.path.join(BACKEND_DIR, "alembic.ini")), "head")
+    yield engine
+    engine.dispose()
+    os.unlink(_scratch.name)
+
+
+@pytest.fixture(scope="session")
+def client(migrated_engine):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
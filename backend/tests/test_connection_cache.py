@@ -0,0 +1,48 @@
+import asyncio
+import threading
+
+from app.connection_cache import ConnectionGraphCache
+from app.pubsub import InMemoryPubSub
+from app.websocket_manager import ConnectionManager
+
+
+async def _start_worker(hub):
+    """A manager and connection cache wired together as share_connection_edits does."""
+    manager = ConnectionManager(backend=InMemoryPubSub(hub))
+    cache = ConnectionGraphCache(100, 300)
+    cache.on_edge_change = lambda user1_id, user2_id, connected: manager.broadcast(
+        "connection_edge", {"users": [user1_id, user2_id], "connected": connected}
+    )
+    manager.on_broadcast(
+        "connection_edge", lambda data: cache.apply_edge(*data["users"], data["connected"])
+    )
+    await manager.start()
+    for user_id, other_id in ((1, 2), (2, 1), (3, 1)):
+        cache.put(user_id, {other_id}, cache.load_token())
+    return manager, cache
+
+
+def test_connection_edits_reach_every_worker():
+    async def run():
+        hub = {}
+        (manager1, cache1), (manager2, cache2) = [await _start_worker(hub) for _ in range(2)]
+
+        # Request handlers run in the threadpool, off the event loop
+        revoke = threading.Thread(target=cache1.remove_connection, args=(1, 2))
+        revoke.start()
+        revoke.join()
+        await asyncio.sleep(0.05)
+        assert cache2.get(1) == frozenset()
+        assert cache2.get(2) == frozenset()
+
+        cache1.add_connection(1, 3)
+        await asyncio.sleep(0.05)
+        assert cache2.get(1) == frozenset({3})
+        assert cache2.get(3) == frozenset({1})
+
+        await manager1.stop()
+        await manager2.stop()
+        # Edits after shutdown have nowhere to go and must not raise
+        cache1.remove_connection(1, 3)
+
+    asyncio.run(run())
@@ -0,0 +1,27 @@
+import pytest
+
+UNKNOWN_USER_PATHS = [
+    "/api/v1/notifications/?user_id=999999",
+    "/api/v1/users/999999/connections",
+    "/api/v1/users/999999/sent-requests",
+    "/api/v1/users/999999/received-requests",
+]
+
+
+@pytest.mark.parametrize("path", UNKNOWN_USER_PATHS)
+def test_unknown_user_is_404_even_with_matching_etag(client, path):
+    assert client.get(path).status_code == 404
+
+    for etag in ('"0"', 'W/"0"', "*"):
+        assert client.get(path, headers={"If-None-Match": etag}).status_code == 404
+
+
+def test_known_user_gets_304_for_current_etag(client):
+    user_id = client.post("/api/v1/users/", json={"username": "etag-user"}).json()["id"]
+    path = f"/api/v1/users/{user_id}/connections"
+
+    response = client.get(path)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
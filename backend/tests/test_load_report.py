@@ -0,0 +1,19 @@
+import pytest
+
+# The load benchmark's own dependencies live in benchmarks/requirements.txt
+pytest.importorskip("httpx")
+pytest.importorskip("websockets")
+
+from benchmarks.load import percentile  # noqa: E402
+
+
+@pytest.mark.parametrize("pct, expected", [(0, 1), (50, 50), (95, 95), (99, 99), (100, 100)])
+def test_percentile_is_nearest_rank(pct, expected):
+    assert percentile(list(range(1, 101)), pct) == expected
+
+
+def test_percentile_of_short_list():
+    samples = [10.0, 20.0, 30.0]
+    assert percentile(samples, 50) == 20.0
+    assert percentile(samples, 99) == 30.0
+    assert percentile([7.0], 95) == 7.0
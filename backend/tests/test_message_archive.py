@@ -0,0 +1,66 @@
+import datetime
+
+import pytest
+
+from app import models
+from app.core.database import SessionLocal
+from scripts.partition_messages import archive
+
+
+@pytest.fixture(scope="module")
+def conversation(client, tmp_path_factory):
+    """Twelve messages m0..m11 between two users, the first eight archived in two
+    monthly segments, plus one live message from the sender to a third user."""
+    sender, receiver, other = [
+        client.post("/api/v1/users/", json={"username": f"archive-user-{i}"}).json()["id"] for i in range(3)
+    ]
+    for receiver_id in (receiver, other):
+        request = client.post(f"/api/v1/connections/send?sender_id={sender}", json={"receiver_id": receiver_id})
+        client.post(f"/api/v1/connections/{request.json()['id']}/accept")
+    for i in range(12):
+        client.post(f"/api/v1/chat/send?sender_id={sender}", json={"receiver_id": receiver, "content": f"m{i}"})
+    client.post(f"/api/v1/chat/send?sender_id={sender}", json={"receiver_id": other, "content": "recent"})
+
+    db = SessionLocal()
+    try:
+        messages = db.query(models.Message).filter(models.Message.receiver_id == receiver).order_by(models.Message.id)
+        for i, message in enumerate(messages):
+            if i < 8:
+                message.created_at = datetime.datetime(2024, 1 + i // 4, 5, 0, 0, i)
+        db.commit()
+        archive(db, datetime.datetime(2024, 3, 1), str(tmp_path_factory.mktemp("archive")))
+        rows = db.query(models.MessageArchiveConversation.row_count).all()
+    finally:
+        db.close()
+    assert [count for count, in rows] == [4, 4]
+    return sender, receiver, other
+
+
+def test_offset_pages_span_archive_and_live_table(client, conversation):
+    sender, receiver, _ = conversation
+    pages = []
+    for page in (1, 2, 3, 4):
+        body = client.get(f"/api/v1/chat/history/{receiver}?current_user_id={sender}&limit=5&page={page}").json()
+        assert body["total_count"] == 12
+        pages.append([m["content"] for m in body["messages"]])
+    assert pages == [[f"m{i}" for i in range(5)], [f"m{i}" for i in range(5, 10)], ["m10", "m11"], []]
+
+
+def test_cursor_pages_walk_back_into_the_archive(client, conversation):
+    sender, receiver, _ = conversation
+    seen, cursor = [], None
+    while True:
+        query = f"current_user_id={sender}&limit=3" + (f"&before={cursor}" if cursor else "")
+        body = client.get(f"/api/v1/chat/history/{receiver}/cursor?{query}").json()
+        seen.extend(m["content"] for m in body["messages"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    assert seen == [f"m{i}" for i in range(11, -1, -1)]
+
+
+def test_short_page_without_archived_messages_has_no_more(client, conversation):
+    sender, _, other = conversation
+    body = client.get(f"/api/v1/chat/history/{other}/cursor?current_user_id={sender}&limit=20").json()
+    assert [m["content"] for m in body["messages"]] == ["recent"]
+    assert body["next_cursor"] is None
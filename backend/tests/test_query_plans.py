@@ -0,0 +1,10 @@
+import pytest
+
+from scripts.check_query_plans import CHECKS, check, checking_connection
+
+
+@pytest.mark.parametrize("name, run, table, expected_indexes", CHECKS, ids=[c[0] for c in CHECKS])
+def test_query_uses_index(migrated_engine, name, run, table, expected_indexes):
+    with checking_connection(migrated_engine) as connection:
+        ok, plan = check(connection, name, run, table, expected_indexes)
+    assert ok, f"{name} is not planned against {sorted(expected_indexes)}:\n{plan}"
@@ -0,0 +1,55 @@
+import asyncio
+
+from app.core import metrics
+from app.websocket_manager import ClientConnection
+
+
+def _count(counter, *labels):
+    if labels:
+        counter = counter.labels(*labels)
+    return counter._value.get()
+
+
+def _connection(policy, dead):
+    async def on_dead(connection, code):
+        dead.append(code)
+
+    # The writer task is never started, so frames stay queued and the socket
+    # object is never touched
+    return ClientConnection(object(), 1, 2, policy, on_dead)
+
+
+def test_drop_oldest_counts_evicted_frame_as_dropped():
+    async def run():
+        connection = _connection("drop_oldest", [])
+        queued = _count(metrics.WS_FRAMES_QUEUED)
+        dropped = _count(metrics.WS_FRAMES_DROPPED, "drop_oldest")
+
+        assert all(connection.send(str(i)) for i in range(3))
+
+        assert _count(metrics.WS_FRAMES_QUEUED) - queued == 3
+        assert _count(metrics.WS_FRAMES_DROPPED, "drop_oldest") - dropped == 1
+        assert [connection.queue.get_nowait() for _ in range(2)] == ["1", "2"]
+
+    asyncio.run(run())
+
+
+def test_disconnect_does_not_count_refused_frames_as_queued():
+    async def run():
+        dead = []
+        connection = _connection("disconnect", dead)
+        queued = _count(metrics.WS_FRAMES_QUEUED)
+        slow = _count(metrics.WS_FRAMES_DROPPED, "slow_consumer")
+        closed = _count(metrics.WS_FRAMES_DROPPED, "closed")
+
+        assert connection.send("0") and connection.send("1")
+        assert not connection.send("2")
+        assert not connection.send("3")
+        await asyncio.sleep(0)
+
+        assert _count(metrics.WS_FRAMES_QUEUED) - queued == 2
+        assert _count(metrics.WS_FRAMES_DROPPED, "slow_consumer") - slow == 1
+        assert _count(metrics.WS_FRAMES_DROPPED, "closed") - closed == 1
+        assert len(dead) == 1
+
+    asyncio.run(run())
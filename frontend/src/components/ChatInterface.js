@@ -11,7 +11,9 @@ function ChatInterface({ currentUser, connections }) {
   const [ws, setWs] = useState(null);
   const [isConnected, setIsConnected] = useState(false);
   const [loading, setLoading] = useState(false);
+  const [throttleNotice, setThrottleNotice] = useState('');
   const messagesEndRef = useRef(null);
+  const throttleTimerRef = useRef(null);
   
   // Use refs to store current values for WebSocket handlers
   const currentUserRef = useRef(currentUser);
@@ -123,6 +125,13 @@ function ChatInterface({ currentUser, connections }) {
         } else if (data.type === 'error') {
           console.error('WebSocket error:', data.message);
           alert('Chat error: ' + data.message);
+        } else if (data.type === 'throttled') {
+          // Not an error: the server dropped the frame and says when to retry
+          console.warn('Message throttled, retry in', data.retry_after, 's');
+          const seconds = Math.max(1, Math.ceil(data.retry_after));
+          setThrottleNotice(`Slow down - message not sent, try again in ${seconds}s`);
+          clearTimeout(throttleTimerRef.current);
+          throttleTimerRef.current = setTimeout(() => setThrottleNotice(''), seconds * 1000);
         }
       } catch (error) {
         console.error('Error parsing WebSocket message:', error);
@@ -162,6 +171,7 @@ function ChatInterface({ currentUser, connections }) {
 
     return () => {
       console.log('Cleaning up WebSocket connection');
+      clearTimeout(throttleTimerRef.current);
       if (websocket.readyState === WebSocket.OPEN) {
         websocket.close(1000, 'Component unmounting');
       }
@@ -278,6 +288,11 @@ function ChatInterface({ currentUser, connections }) {
         }}>
           WebSocket: {isConnected ? '🟢 Connected' : '🔴 Disconnected'}
         </span>
+        {throttleNotice && (
+          <span style={{ color: '#666', marginLeft: '1rem' }}>
+            ⏳ {throttleNotice}
+          </span>
+        )}
       </div>
 
       <div className="chat-container">